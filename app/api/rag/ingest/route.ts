@@ -16,7 +16,9 @@ export async function POST(request: Request) {
       ? body.sourceTypes
       : undefined;
     const sourceId = body?.source_id ? String(body.source_id) : undefined;
-    const results = await ingestSources(sourceTypes, sourceId);
+    // full: watermark 무시하고 전체 재확인 (내용이 같은 문서는 그대로 유지)
+    const full = body?.full === true;
+    const results = await ingestSources(sourceTypes, sourceId, { full });
     return Response.json({ ok: true, results });
   } catch (error: any) {
     return Response.json(
@@ -0,0 +1,50 @@
+-- ============================================
+-- HEALO: RAG 코퍼스 시그니처 RPC (rag_corpus_signature)
+-- ============================================
+-- 목적:
+-- - 검색 결과 캐시 재검증 (scripts/evaluation_colab.py RetrievalCache)을 1번의 왕복으로
+-- - updated_at keyset으로는 알 수 없는 삭제(rag_documents / rag_chunks)도 감지
+--
+-- 설계:
+-- - document_count / chunk_count / id_checksum: 행이 추가·삭제되면 바뀜
+--   (id_checksum = id의 hashtext 합 → 같은 수만큼 삭제 + 추가돼도 바뀜)
+-- - max_updated_at / max_id: 가장 최근에 바뀐 문서의 (updated_at, id)
+--   → 캐시의 keyset watermark와 같으면 바뀐 문서 조회를 생략
+-- ============================================
+
+CREATE OR REPLACE FUNCTION public.rag_corpus_signature()
+RETURNS TABLE (
+  document_count BIGINT,
+  chunk_count BIGINT,
+  id_checksum BIGINT,
+  max_updated_at TIMESTAMPTZ,
+  max_id UUID
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    d.document_count,
+    c.chunk_count,
+    d.id_checksum + c.id_checksum,
+    latest.updated_at,
+    latest.id
+  FROM (
+    SELECT COUNT(*) AS document_count, COALESCE(SUM(hashtext(id::text)::BIGINT), 0) AS id_checksum
+    FROM public.rag_documents
+  ) d
+  CROSS JOIN (
+    SELECT COUNT(*) AS chunk_count, COALESCE(SUM(hashtext(id::text)::BIGINT), 0) AS id_checksum
+    FROM public.rag_chunks
+  ) c
+  LEFT JOIN LATERAL (
+    SELECT updated_at, id
+    FROM public.rag_documents
+    WHERE updated_at IS NOT NULL
+    ORDER BY updated_at DESC, id DESC
+    LIMIT 1
+  ) latest ON TRUE;
+$$;
+
+-- 코멘트
+COMMENT ON FUNCTION public.rag_corpus_signature IS 'RAG 코퍼스 시그니처 (문서/청크 수, id 체크섬, 최근 변경 문서) — 검색 결과 캐시 재검증용';
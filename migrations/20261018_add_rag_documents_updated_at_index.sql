@@ -0,0 +1,10 @@
+-- ============================================
+-- HEALO: rag_documents.updated_at 인덱스
+-- ============================================
+-- 목적:
+-- - 검색 결과 캐시 재검증 (scripts/evaluation_colab.py RetrievalCache)
+--   "updated_at >= 마지막 확인 시각" 조회가 테이블 스캔 없이 끝나도록
+-- ============================================
+
+CREATE INDEX IF NOT EXISTS idx_rag_documents_updated_at
+  ON public.rag_documents (updated_at);
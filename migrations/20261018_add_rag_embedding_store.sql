@@ -0,0 +1,42 @@
+-- ============================================
+-- HEALO: RAG 임베딩 저장소 (content hash 기준 재사용)
+-- ============================================
+-- 목적:
+-- - ingest가 청크를 다시 만들어도 내용이 같으면 임베딩을 재계산하지 않음
+-- - 새로 생긴/바뀐 청크만 임베딩 API 호출 (야간 갱신 비용 = 변경량에 비례)
+--
+-- 설계:
+-- - rag_embedding_store: content_hash = sha256(model || '\n' || 공백 정규화한 내용)
+--   (rag_chunks 삭제와 무관하게 유지됨)
+-- - rag_embeddings.content_hash: 청크별로 어떤 내용으로 임베딩했는지 기록
+--   (현재 내용의 hash와 같으면 건너뜀)
+-- ============================================
+
+-- 1. 임베딩 저장소
+CREATE TABLE IF NOT EXISTS public.rag_embedding_store (
+  content_hash TEXT PRIMARY KEY,
+  model TEXT NOT NULL,
+  embedding VECTOR(1536) NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- 2. 청크 임베딩에 content_hash 기록
+ALTER TABLE public.rag_embeddings
+  ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_rag_embeddings_content_hash
+  ON public.rag_embeddings (content_hash);
+
+-- 3. RLS (service role 전용)
+ALTER TABLE public.rag_embedding_store ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS rag_embedding_store_service_only ON public.rag_embedding_store;
+CREATE POLICY rag_embedding_store_service_only
+  ON public.rag_embedding_store
+  FOR ALL
+  USING (auth.role() = 'service_role')
+  WITH CHECK (auth.role() = 'service_role');
+
+-- 코멘트
+COMMENT ON TABLE public.rag_embedding_store IS '내용 hash 기준 임베딩 저장소 (청크 재생성 시 재사용)';
+COMMENT ON COLUMN public.rag_embeddings.content_hash IS '임베딩 당시 청크 내용 hash (rag_embedding_store.content_hash)';
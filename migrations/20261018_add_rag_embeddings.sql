@@ -0,0 +1,90 @@
+-- ============================================
+-- HEALO: RAG 임베딩 (pgvector)
+-- ============================================
+-- 목적:
+-- - rag_chunks 임베딩 저장 (20260124_add_rag_inquiry_tables.sql에서 주석으로만 제공되던 테이블)
+-- - 벡터 유사도 검색 RPC (match_rag_chunks)
+--
+-- 설계:
+-- - 모델: OpenAI text-embedding-3-small (1536차원)
+-- - 청크당 1행 (chunk_id UNIQUE → upsert)
+-- - HNSW 인덱스 (cosine)
+-- ============================================
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- 1. 임베딩 테이블
+CREATE TABLE IF NOT EXISTS public.rag_embeddings (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  document_id UUID REFERENCES public.rag_documents(id) ON DELETE CASCADE,
+  chunk_id UUID REFERENCES public.rag_chunks(id) ON DELETE CASCADE,
+  model TEXT NOT NULL DEFAULT 'text-embedding-3-small',
+  embedding VECTOR(1536) NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rag_embeddings_chunk_id
+  ON public.rag_embeddings (chunk_id);
+
+CREATE INDEX IF NOT EXISTS idx_rag_embeddings_embedding_hnsw
+  ON public.rag_embeddings USING hnsw (embedding vector_cosine_ops);
+
+-- 2. RLS (service role 전용)
+ALTER TABLE public.rag_embeddings ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS rag_embeddings_service_only ON public.rag_embeddings;
+CREATE POLICY rag_embeddings_service_only
+  ON public.rag_embeddings
+  FOR ALL
+  USING (auth.role() = 'service_role')
+  WITH CHECK (auth.role() = 'service_role');
+
+-- 3. 벡터 검색 함수 (search_rag_chunks와 같은 결과 형태)
+CREATE OR REPLACE FUNCTION public.match_rag_chunks(
+  query_embedding VECTOR(1536),
+  query_lang TEXT DEFAULT NULL,
+  match_count INTEGER DEFAULT 6
+)
+RETURNS TABLE (
+  id UUID,
+  document_id UUID,
+  chunk_index INTEGER,
+  content TEXT,
+  metadata JSONB,
+  source_type TEXT,
+  source_id UUID,
+  lang TEXT,
+  title TEXT,
+  version INTEGER,
+  updated_at TIMESTAMPTZ,
+  score REAL
+)
+LANGUAGE sql
+STABLE
+-- 언어 필터로 걸러지는 후보가 있으므로 기본값(40)보다 넓게 탐색
+SET hnsw.ef_search = 100
+AS $$
+  SELECT
+    c.id,
+    c.document_id,
+    c.chunk_index,
+    c.content,
+    c.metadata,
+    d.source_type,
+    d.source_id,
+    d.lang,
+    d.title,
+    d.version,
+    d.updated_at,
+    (1 - (e.embedding <=> query_embedding))::REAL AS score
+  FROM public.rag_embeddings e
+  JOIN public.rag_chunks c ON c.id = e.chunk_id
+  JOIN public.rag_documents d ON d.id = c.document_id
+  WHERE query_lang IS NULL OR d.lang = query_lang
+  ORDER BY e.embedding <=> query_embedding
+  LIMIT GREATEST(match_count, 1);
+$$;
+
+-- 코멘트
+COMMENT ON TABLE public.rag_embeddings IS 'rag_chunks 임베딩 (text-embedding-3-small, 1536차원)';
+COMMENT ON FUNCTION public.match_rag_chunks IS 'RAG 청크 벡터 유사도 검색 (cosine, 언어 필터 포함)';
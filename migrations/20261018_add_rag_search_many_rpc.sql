@@ -0,0 +1,59 @@
+-- ============================================
+-- HEALO: RAG 다중 질문 검색 RPC (search_rag_chunks_many)
+-- ============================================
+-- 목적:
+-- - 질문 수백 개의 top-k를 한 번의 요청으로 조회 (평가/일괄 재랭킹용)
+-- - 질문마다 PostgREST 왕복 + rag_documents 조인을 반복하지 않음
+--
+-- 설계:
+-- - search_rag_chunks (20261018_add_rag_search_rpc.sql)를 질문마다 LATERAL로 호출
+-- - query_langs: 질문별 언어 (NULL 배열 또는 NULL 원소 = 언어 필터 없음)
+-- - query_index: query_texts 안에서의 위치 (0부터)
+-- ============================================
+
+CREATE OR REPLACE FUNCTION public.search_rag_chunks_many(
+  query_texts TEXT[],
+  query_langs TEXT[] DEFAULT NULL,
+  match_count INTEGER DEFAULT 6
+)
+RETURNS TABLE (
+  query_index INTEGER,
+  id UUID,
+  document_id UUID,
+  chunk_index INTEGER,
+  content TEXT,
+  metadata JSONB,
+  source_type TEXT,
+  source_id UUID,
+  lang TEXT,
+  title TEXT,
+  version INTEGER,
+  updated_at TIMESTAMPTZ,
+  score REAL
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    (q.ord - 1)::INTEGER AS query_index,
+    r.id,
+    r.document_id,
+    r.chunk_index,
+    r.content,
+    r.metadata,
+    r.source_type,
+    r.source_id,
+    r.lang,
+    r.title,
+    r.version,
+    r.updated_at,
+    r.score
+  FROM unnest(query_texts, COALESCE(query_langs, '{}'::TEXT[]))
+    WITH ORDINALITY AS q(query_text, query_lang, ord)
+  CROSS JOIN LATERAL public.search_rag_chunks(q.query_text, q.query_lang, match_count) r
+  WHERE q.query_text IS NOT NULL
+  ORDER BY q.ord, r.score DESC;
+$$;
+
+-- 코멘트
+COMMENT ON FUNCTION public.search_rag_chunks_many IS 'RAG 청크 랭킹 검색 (질문 여러 개를 한 번에, 결과에 query_index 포함)';
@@ -0,0 +1,116 @@
+-- ============================================
+-- HEALO: RAG 검색 RPC (search_rag_chunks)
+-- ============================================
+-- 목적:
+-- - ILIKE '%질문 전체%' 순차 스캔을 인덱스 기반 랭킹 검색으로 대체
+-- - rag_documents.lang 필터를 DB 안에서 먼저 적용 (limit 후 필터링 제거)
+-- - top-k + 점수를 한 번의 왕복으로 반환
+--
+-- 설계:
+-- - 라틴 문자(en): tsvector + GIN, 질문 단어를 OR로 묶어 ts_rank_cd로 정렬
+-- - 한국어/일본어(ko/ja): pg_trgm GIN, word_similarity로 정렬
+--   (형태소 분석기 없이도 부분 일치가 되도록 trigram 사용)
+-- ============================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 1. 인덱스용 컬럼/인덱스
+ALTER TABLE public.rag_chunks
+  ADD COLUMN IF NOT EXISTS content_tsv TSVECTOR
+  GENERATED ALWAYS AS (to_tsvector('english', COALESCE(content, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_rag_chunks_content_tsv
+  ON public.rag_chunks USING GIN (content_tsv);
+
+CREATE INDEX IF NOT EXISTS idx_rag_chunks_content_trgm
+  ON public.rag_chunks USING GIN (content gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_rag_chunks_document_id
+  ON public.rag_chunks (document_id);
+
+CREATE INDEX IF NOT EXISTS idx_rag_documents_lang
+  ON public.rag_documents (lang);
+
+-- 2. 검색 함수
+CREATE OR REPLACE FUNCTION public.search_rag_chunks(
+  query_text TEXT,
+  query_lang TEXT DEFAULT NULL,
+  match_count INTEGER DEFAULT 6
+)
+RETURNS TABLE (
+  id UUID,
+  document_id UUID,
+  chunk_index INTEGER,
+  content TEXT,
+  metadata JSONB,
+  source_type TEXT,
+  source_id UUID,
+  lang TEXT,
+  title TEXT,
+  version INTEGER,
+  updated_at TIMESTAMPTZ,
+  score REAL
+)
+LANGUAGE sql
+STABLE
+-- 기본값 0.6은 문장 단위 질문에 너무 엄격함
+SET pg_trgm.word_similarity_threshold = 0.3
+AS $$
+  WITH terms AS (
+    -- 구두점 제거 후 단어를 OR로 연결 ("rhinoplasty or seoul or cost")
+    SELECT websearch_to_tsquery(
+      'english',
+      regexp_replace(
+        trim(regexp_replace(query_text, '[^[:alnum:]]+', ' ', 'g')),
+        '\s+', ' or ', 'g'
+      )
+    ) AS q
+  ),
+  candidates AS (
+    -- 라틴 문자: FTS
+    SELECT c.id AS chunk_id, ts_rank_cd(c.content_tsv, terms.q) AS score
+    FROM public.rag_chunks c
+    JOIN public.rag_documents d ON d.id = c.document_id
+    CROSS JOIN terms
+    WHERE (query_lang IS NULL OR query_lang NOT IN ('ko', 'ja'))
+      AND (query_lang IS NULL OR d.lang = query_lang)
+      AND c.content_tsv @@ terms.q
+
+    UNION ALL
+
+    -- 한국어/일본어: trigram
+    SELECT c.id AS chunk_id, word_similarity(query_text, c.content) AS score
+    FROM public.rag_chunks c
+    JOIN public.rag_documents d ON d.id = c.document_id
+    WHERE (query_lang IS NULL OR query_lang IN ('ko', 'ja'))
+      AND (query_lang IS NULL OR d.lang = query_lang)
+      AND query_text <% c.content
+  ),
+  best AS (
+    SELECT chunk_id, MAX(score) AS score
+    FROM candidates
+    GROUP BY chunk_id
+    ORDER BY MAX(score) DESC
+    LIMIT GREATEST(match_count, 1)
+  )
+  SELECT
+    c.id,
+    c.document_id,
+    c.chunk_index,
+    c.content,
+    c.metadata,
+    d.source_type,
+    d.source_id,
+    d.lang,
+    d.title,
+    d.version,
+    d.updated_at,
+    best.score::REAL
+  FROM best
+  JOIN public.rag_chunks c ON c.id = best.chunk_id
+  JOIN public.rag_documents d ON d.id = c.document_id
+  ORDER BY best.score DESC;
+$$;
+
+-- 코멘트
+COMMENT ON FUNCTION public.search_rag_chunks IS 'RAG 청크 랭킹 검색 (en: FTS, ko/ja: trigram, 언어 필터 포함)';
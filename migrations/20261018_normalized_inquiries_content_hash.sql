@@ -0,0 +1,22 @@
+-- ============================================
+-- HEALO: normalized_inquiries 멱등 기록 (content_hash)
+-- ============================================
+-- 목적:
+-- - 평가 스크립트를 다시 돌릴 때마다 같은 문의가 중복 insert 되는 문제 방지
+-- - 테이블 크기가 실행 횟수가 아니라 고유 문의 수에 비례하도록
+--
+-- 설계:
+-- - content_hash = sha256(source_type || '\n' || language || '\n' || 공백 정규화한 raw_message)
+--   (scripts/evaluation_colab.py normalization_content_hash와 같은 계산)
+-- - UNIQUE 인덱스 → upsert (on_conflict=content_hash, 중복이면 기존 행 유지)
+-- - content_hash를 채우지 않는 기존 경로(api/chat, api/inquiry/normalize)는 NULL이라 영향 없음
+--   (NULL끼리는 UNIQUE 충돌이 나지 않음)
+-- ============================================
+
+ALTER TABLE public.normalized_inquiries
+  ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS normalized_inquiries_content_hash_key
+  ON public.normalized_inquiries (content_hash);
+
+COMMENT ON COLUMN public.normalized_inquiries.content_hash IS '멱등 키 (source_type + language + 정규화한 raw_message의 sha256)';
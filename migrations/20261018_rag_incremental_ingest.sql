@@ -0,0 +1,71 @@
+-- ============================================
+-- HEALO: RAG 증분 적재 (src/lib/rag/ingest.ts)
+-- ============================================
+-- 목적:
+-- - 소스 테이블에서 watermark 이후 바뀐 행만 읽어 rag_documents/rag_chunks 갱신
+-- - 내용 hash가 바뀐 문서만 version 증가 + 청크 재작성
+-- - 문서/청크를 행 단위 select/insert 대신 배치 upsert로 기록
+--
+-- 설계:
+-- - rag_documents.content_hash: sha256(content) hex (ingest.ts와 같은 계산)
+-- - rag_documents (source_type, source_id, lang) UNIQUE → upsert 충돌 키
+-- - rag_chunks (document_id, chunk_index) UNIQUE → 청크를 제자리 갱신
+--   (청크 id가 유지되므로 rag_embeddings는 content_hash로 변경 여부 판단)
+-- - rag_ingest_state: 소스별 keyset 커서 (변경 시각, id)
+-- ============================================
+
+-- 1. 문서 내용 hash
+ALTER TABLE public.rag_documents
+  ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+UPDATE public.rag_documents
+SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex')
+WHERE content_hash IS NULL;
+
+-- 2. 중복 정리 후 upsert 키 생성 (같은 소스/언어 문서는 가장 최근 것 1개만 유지)
+--    updated_at이 NULL인 행도 순위에 포함 (NULLS LAST → NULL만 있으면 id가 큰 행 유지)
+DELETE FROM public.rag_documents d
+USING (
+  SELECT
+    id,
+    row_number() OVER (
+      PARTITION BY source_type, source_id, lang
+      ORDER BY updated_at DESC NULLS LAST, id DESC
+    ) AS rn
+  FROM public.rag_documents
+) ranked
+WHERE d.id = ranked.id
+  AND ranked.rn > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rag_documents_source_unique
+  ON public.rag_documents (source_type, source_id, lang);
+
+DELETE FROM public.rag_chunks c
+USING public.rag_chunks other
+WHERE c.document_id = other.document_id
+  AND c.chunk_index = other.chunk_index
+  AND c.id < other.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rag_chunks_document_chunk_unique
+  ON public.rag_chunks (document_id, chunk_index);
+
+-- 3. 소스별 적재 커서
+CREATE TABLE IF NOT EXISTS public.rag_ingest_state (
+  source_type TEXT PRIMARY KEY,
+  cursor_at TIMESTAMPTZ,
+  cursor_id TEXT,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE public.rag_ingest_state ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS rag_ingest_state_service_only ON public.rag_ingest_state;
+CREATE POLICY rag_ingest_state_service_only
+  ON public.rag_ingest_state
+  FOR ALL
+  USING (auth.role() = 'service_role')
+  WITH CHECK (auth.role() = 'service_role');
+
+-- 코멘트
+COMMENT ON COLUMN public.rag_documents.content_hash IS 'sha256(content) hex, 바뀐 경우에만 version 증가';
+COMMENT ON TABLE public.rag_ingest_state IS 'RAG 증분 적재 커서 (소스별 마지막으로 처리한 변경 시각 + id)';
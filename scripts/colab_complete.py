@@ -1,6 +1,7 @@
 """
 HEALO RAG Evaluation - Colab 완전판
-이 파일의 전체 내용을 Colab의 하나의 셀에 복사해서 붙여넣으세요.
+1. scripts/rate_limit.py를 Colab 파일 탭(/content)에 먼저 업로드하세요. (rate limiter 공용 모듈)
+2. 이 파일의 전체 내용을 Colab의 하나의 셀에 복사해서 붙여넣으세요.
 """
 
 # ============================================================================
@@ -26,6 +27,12 @@ from openai import OpenAI
 import google.generativeai as genai
 from supabase import create_client, Client
 import pandas as pd
+try:
+    from rate_limit import call_with_rate_limit, print_rate_limit_stats
+except ImportError as e:
+    raise ImportError(
+        "rate_limit.py not found: upload scripts/rate_limit.py to the Colab working directory (/content) first"
+    ) from e
 
 # ============================================================================
 # 3. 환경 변수 설정 (여기에 실제 값 입력!)
@@ -159,6 +166,31 @@ def detect_language(value: str) -> str:
     return "en"
 
 
+def call_llm(system_prompt: str, inquiry: str) -> str:
+    """LLM 호출 (LLM_PROVIDER별 Rate Limiter 적용)"""
+    if LLM_PROVIDER == "google":
+        def generate():
+            genai.configure(api_key=GOOGLE_GENERATIVE_AI_API_KEY)
+            model = genai.GenerativeModel("gemini-2.0-flash")
+            return model.generate_content(
+                f"{system_prompt}\n\nUser: {inquiry}\n\nAssistant:"
+            )
+
+        return call_with_rate_limit("google", generate).text
+
+    def complete():
+        client = OpenAI(api_key=OPENAI_API_KEY)
+        return client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": inquiry},
+            ],
+        )
+
+    return call_with_rate_limit("openai", complete).choices[0].message.content
+
+
 def get_baseline_response(inquiry: str, lang: str) -> str:
     """일반 LLM 응답 (RAG 없이)"""
     system_prompt = """You are a medical concierge assistant for HEALO.
@@ -167,23 +199,7 @@ Ask clarifying questions when constraints are missing.
 Primary objective: guide the user to submit an inquiry."""
 
     try:
-        if LLM_PROVIDER == "google":
-            genai.configure(api_key=GOOGLE_GENERATIVE_AI_API_KEY)
-            model = genai.GenerativeModel("gemini-2.0-flash")
-            response = model.generate_content(
-                f"{system_prompt}\n\nUser: {inquiry}\n\nAssistant:"
-            )
-            return response.text
-        else:
-            client = OpenAI(api_key=OPENAI_API_KEY)
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": inquiry},
-                ],
-            )
-            return response.choices[0].message.content
+        return call_llm(system_prompt, inquiry)
     except Exception as e:
         print(f"[Baseline] Error: {str(e)}")
         return f"[ERROR: {str(e)}]"
@@ -198,9 +214,9 @@ def search_rag(query: str, lang: str, supabase: Client) -> List[Dict]:
         if not tokens:
             tokens = [query]
         
-        result = supabase.table("rag_chunks").select(
+        result = call_with_rate_limit("supabase", supabase.table("rag_chunks").select(
             "id, document_id, chunk_index, content, metadata, rag_documents(id, source_type, source_id, lang, title)"
-        ).ilike("content", f"%{query}%").limit(6).execute()
+        ).ilike("content", f"%{query}%").limit(6).execute)
         
         if lang:
             chunks = [c for c in (result.data or []) if c.get("rag_documents", {}).get("lang") == lang]
@@ -242,14 +258,14 @@ def get_rag_response(inquiry: str, lang: str, supabase: Client) -> Tuple[str, st
     normalized = None
     try:
         language = detect_language(lang)
-        result = supabase.table("normalized_inquiries").insert({
+        result = call_with_rate_limit("supabase", supabase.table("normalized_inquiries").insert({
             "source_type": "ai_agent",
             "language": language,
             "raw_message": inquiry,
             "constraints": {},
             "treatment_slug": None,
             "objective": None,
-        }).execute()
+        }).execute)
         if result.data:
             normalized = result.data[0]
     except Exception as e:
@@ -260,33 +276,17 @@ def get_rag_response(inquiry: str, lang: str, supabase: Client) -> Tuple[str, st
     context = build_context(rag_chunks)
     
     # 3. LLM 응답 (RAG 컨텍스트 포함)
+    context_section = f"Context:\n{context}" if context else ""
     system_prompt = f"""You are a medical concierge assistant for HEALO.
 Do not provide diagnosis, medical advice, or guarantees.
 Ask clarifying questions when constraints are missing.
 Primary objective: guide the user to submit an inquiry.
 If relevant, reference the provided context briefly.
 
-{('Context:\n' + context) if context else ''}"""
+{context_section}"""
 
     try:
-        if LLM_PROVIDER == "google":
-            genai.configure(api_key=GOOGLE_GENERATIVE_AI_API_KEY)
-            model = genai.GenerativeModel("gemini-2.0-flash")
-            response = model.generate_content(
-                f"{system_prompt}\n\nUser: {inquiry}\n\nAssistant:"
-            )
-            response_text = response.text
-        else:
-            client = OpenAI(api_key=OPENAI_API_KEY)
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": inquiry},
-                ],
-            )
-            response_text = response.choices[0].message.content
-        
+        response_text = call_llm(system_prompt, inquiry)
         return response_text, context, normalized or {}
     except Exception as e:
         print(f"[RAG] Error: {str(e)}")
@@ -414,14 +414,12 @@ else:
         # Baseline LLM
         print("  → Baseline LLM...")
         baseline_response = get_baseline_response(inquiry["text"], inquiry["lang"])
-        time.sleep(0.5)
         
         # RAG + Normalize
         print("  → RAG + Normalize...")
         rag_response, rag_context, normalized = get_rag_response(
             inquiry["text"], inquiry["lang"], supabase
         )
-        time.sleep(0.5)
         
         # 평가
         intent_match_baseline = evaluate_intent_match(
@@ -455,6 +453,7 @@ else:
     
     # 통계 출력
     print_statistics(results)
+    print_rate_limit_stats()
     
     print("\n✅ Evaluation completed!")
     
@@ -11,15 +11,39 @@ HEALO RAG Evaluation Script (Google Colab 버전)
 """
 
 import os
+import sys
+import argparse
 import json
 import csv
+import hashlib
+import sqlite3
 import time
 import re
+import math
+import asyncio
+import heapq
+import threading
+import atexit
+import uuid
+import unicodedata
+import zlib
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any, Tuple
-from openai import OpenAI
+from typing import List, Dict, Any, Tuple, Optional, Iterable, Iterator, Callable
+import httpx
+from openai import OpenAI, DefaultHttpxClient
 import google.generativeai as genai
 from supabase import create_client, Client
+# 같은 디렉터리의 rate_limit.py (Colab에서는 함께 업로드)
+try:
+    from rate_limit import call_with_rate_limit, get_rate_limiter, print_rate_limit_stats
+except ImportError as e:
+    raise ImportError(
+        "rate_limit.py not found: upload scripts/rate_limit.py next to evaluation_colab.py (Colab: /content)"
+    ) from e
 
 # ============================================================================
 # 설정
@@ -32,6 +56,77 @@ GOOGLE_GENERATIVE_AI_API_KEY = os.getenv("GOOGLE_GENERATIVE_AI_API_KEY", "")
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY", "")
 
+# 프로바이더별 모델
+LLM_MODELS = {
+    "openai": "gpt-4o-mini",
+    "google": "gemini-2.0-flash",
+}
+
+# 동시 실행 설정
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "8"))  # 동시에 진행할 LLM/DB 호출 수
+
+# LLM 응답 캐시 (빈 값이면 비활성화)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+# RAG 검색
+RAG_BACKEND = os.getenv("RAG_BACKEND", "rpc").lower()  # rpc: DB 랭킹 함수 / local: 메모리 BM25 / vector: pgvector / hybrid
+RAG_TOP_K = 6
+RAG_SEARCH_RPC = "search_rag_chunks"  # migrations/20261018_add_rag_search_rpc.sql
+RAG_VECTOR_RPC = "match_rag_chunks"  # migrations/20261018_add_rag_embeddings.sql
+RAG_SEARCH_MANY_RPC = "search_rag_chunks_many"  # migrations/20261018_add_rag_search_many_rpc.sql
+RAG_CORPUS_SIGNATURE_RPC = "rag_corpus_signature"  # migrations/20261018_add_rag_corpus_signature_rpc.sql
+RAG_MANY_BATCH_SIZE = 200  # search_rag_many 요청 1번에 보낼 질문 수
+RAG_PREFETCH_BATCH = int(os.getenv("RAG_PREFETCH_BATCH", "200"))  # 평가 중 문의 N개씩 미리 검색 (0이면 비활성화)
+
+# Hybrid 검색 (키워드 + 벡터 결과 융합)
+RAG_HYBRID_KEYWORD_BACKEND = os.getenv("RAG_HYBRID_KEYWORD_BACKEND", "rpc").lower()  # rpc / local
+RAG_HYBRID_FUSION = os.getenv("RAG_HYBRID_FUSION", "rrf").lower()  # rrf: 순위 기반 / weighted: 정규화 점수 가중합
+RAG_HYBRID_WEIGHTS = {
+    "keyword": float(os.getenv("RAG_HYBRID_KEYWORD_WEIGHT", "1.0")),
+    "vector": float(os.getenv("RAG_HYBRID_VECTOR_WEIGHT", "1.0")),
+}
+RAG_HYBRID_CANDIDATES = 4  # 각 검색에서 k * N개 후보를 가져와서 융합
+RAG_RRF_K = 60  # RRF 상수 (1 / (RAG_RRF_K + rank))
+
+# 컨텍스트 패킹 (build_context): 토큰 예산 / 거의 같은 청크 판정 기준 (4글자 shingle Jaccard)
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500"))  # 0이면 제한 없음
+RAG_CONTEXT_NEAR_DUP = float(os.getenv("RAG_CONTEXT_NEAR_DUP", "0.9"))
+
+# 검색 결과 캐시 (RAG_CACHE_SIZE=0이면 비활성화)
+RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", "10000"))  # 최대 항목 수 (LRU)
+# 코퍼스 변경 확인 주기: 0(기본)이면 매 조회 전에 확인 (오래된 결과를 내지 않음),
+# N>0이면 최대 N초 동안 바뀌거나 삭제된 청크가 반환될 수 있음 (DB 왕복을 줄이는 대신)
+RAG_CACHE_REVALIDATE_SECONDS = float(os.getenv("RAG_CACHE_REVALIDATE_SECONDS", "0"))
+
+# 코퍼스 스냅샷 (Arrow IPC, export_rag_snapshot으로 생성)
+# 지정하면 RAG_BACKEND=local 검색이 Supabase 대신 이 파일을 memory-map해서 사용
+RAG_SNAPSHOT_PATH = os.getenv("RAG_SNAPSHOT_PATH", "")
+
+# 임베딩 (rag_embeddings.embedding VECTOR(1536)과 차원이 같은 모델이어야 함)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))  # 임베딩 API 1회 호출당 텍스트 수
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))  # 동시에 진행할 배치 수
+
+# 대량 적재 (DATABASE_URL이 있으면 COPY, 없으면 PostgREST 배치 upsert)
+DATABASE_URL = os.getenv("DATABASE_URL", "")  # Supabase > Settings > Database > Connection string
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "5000"))
+BULK_WRITERS = int(os.getenv("BULK_WRITERS", "4"))
+
+# normalized_inquiries write-behind (N건이 모이거나 N초가 지나면 multi-row insert)
+NORMALIZE_FLUSH_SIZE = int(os.getenv("NORMALIZE_FLUSH_SIZE", "100"))
+NORMALIZE_FLUSH_SECONDS = float(os.getenv("NORMALIZE_FLUSH_SECONDS", "2"))
+NORMALIZE_DEDUPE_SIZE = int(os.getenv("NORMALIZE_DEDUPE_SIZE", "10000"))  # 프로세스 안 중복 제거용 최근 content_hash 수
+
+# Grounding overlap (shingle 기반): 컨텍스트가 이 글자 수를 넘으면 scaled MinHash 스케치(약 이 크기)로 추정
+GROUNDING_MINHASH_MIN_SHINGLES = int(os.getenv("GROUNDING_MINHASH_MIN_SHINGLES", "200000"))
+
+# 체크포인트 저널 (완료된 문의를 1건씩 기록, --resume 시 재사용)
+EVAL_CHECKPOINT_PATH = os.getenv("EVAL_CHECKPOINT_PATH", "evaluation_checkpoint.jsonl")
+
+# 결과 CSV를 몇 건마다 flush할지
+EVAL_FLUSH_EVERY = int(os.getenv("EVAL_FLUSH_EVERY", "50"))
+
 # ============================================================================
 # 가상 문의 템플릿
 # ============================================================================
@@ -109,9 +204,8 @@ INQUIRY_TEMPLATES = {
 # 유틸리티 함수
 # ============================================================================
 
-def generate_inquiries(count: int = 200) -> List[Dict[str, Any]]:
-    """가상 문의 200개 생성 (다국어 혼합)"""
-    inquiries = []
+def iter_inquiries(count: int = 200) -> Iterator[Dict[str, Any]]:
+    """가상 문의를 하나씩 생성 (다국어 혼합, 메모리에 목록을 만들지 않음)"""
     langs = ["en", "ja", "ko"]
     
     for i in range(count):
@@ -128,13 +222,100 @@ def generate_inquiries(count: int = 200) -> List[Dict[str, Any]]:
         ]
         text = variations[i % len(variations)]
         
-        inquiries.append({
+        yield {
             "id": i + 1,
             "text": text,
             "lang": lang,
-        })
-    
-    return inquiries
+        }
+
+
+def generate_inquiries(count: int = 200) -> List[Dict[str, Any]]:
+    """가상 문의 200개 생성 (다국어 혼합)"""
+    return list(iter_inquiries(count))
+
+
+_ASCII_WORD_RE = re.compile(r"[a-z0-9]+")
+_TOKEN_RUN_RE = re.compile(
+    r"(?P<word>[a-z0-9]+)"
+    r"|(?P<hangul>[가-힣]+)"
+    r"|(?P<cjk>[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]+)"  # 히라가나/가타카나/한자
+)
+
+
+def _char_ngrams(run: str, sizes: Tuple[int, ...]) -> List[str]:
+    """문자 n-gram (run이 가장 작은 n보다 짧으면 run 그대로)"""
+    if len(run) < min(sizes):
+        return [run]
+    return [run[i:i + n] for n in sizes for i in range(len(run) - n + 1)]
+
+
+def tokenize(
+    text: str,
+    min_len: int = 3,
+    ngram_sizes: Tuple[int, ...] = (2, 3),
+    hangul_ngrams: bool = True,
+) -> List[str]:
+    """검색/평가 공용 토큰화
+
+    - NFKC 정규화 + 소문자 (전각 영숫자, 반각 가나 통일)
+    - 영문/숫자: 단어 단위 (min_len 글자 이상)
+    - 가나/한자: 띄어쓰기가 없으므로 문자 n-gram
+    - 한글: hangul_ngrams=True면 n-gram (조사가 붙은 어절도 일치), 아니면 어절 단위
+    - ASCII 텍스트는 정규화 없이 바로 처리
+    """
+    if not text:
+        return []
+    if text.isascii():
+        return [t for t in _ASCII_WORD_RE.findall(text.lower()) if len(t) >= min_len]
+
+    tokens: List[str] = []
+    for m in _TOKEN_RUN_RE.finditer(unicodedata.normalize("NFKC", text).lower()):
+        run = m.group()
+        if m.lastgroup == "cjk" or (m.lastgroup == "hangul" and hangul_ngrams):
+            tokens.extend(_char_ngrams(run, ngram_sizes))
+        elif len(run) >= min_len:
+            tokens.append(run)
+    return tokens
+
+
+def iter_batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """size개씩 묶어서 순회"""
+    batch: List[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_bounded(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    concurrency: int,
+) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+    """items를 스레드 concurrency개로 처리하고 (item, 결과, 예외)를 제출 순서대로 반환
+
+    진행 중인 작업은 concurrency * 2개 이하 (items를 한 번에 다 읽지 않음)
+    """
+    concurrency = max(1, concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending: "OrderedDict[Any, Any]" = OrderedDict()
+
+        def pop_oldest():
+            future, item = pending.popitem(last=False)
+            try:
+                return item, future.result(), None
+            except Exception as e:
+                return item, None, e
+
+        for item in items:
+            pending[executor.submit(func, item)] = item
+            while len(pending) > concurrency * 2:
+                yield pop_oldest()
+        while pending:
+            yield pop_oldest()
 
 
 def detect_language(value: str) -> str:
@@ -147,10 +328,988 @@ def detect_language(value: str) -> str:
     return "en"
 
 
+# 텍스트 언어 판별용 문자 블록
+_HANGUL_CHAR_RE = re.compile(r"[\u1100-\u11ff\u3130-\u318f\uac00-\ud7a3]")  # 자모 + 음절
+_KANA_CHAR_RE = re.compile(r"[\u3040-\u30ff\u31f0-\u31ff\uff66-\uff9f]")  # 히라가나/가타카나 (반각 포함)
+_HAN_CHAR_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")  # 한자
+_LATIN_CHAR_RE = re.compile(r"[A-Za-z\u00c0-\u024f]")
+# 한글 음절/가나/한자 1자는 라틴 문자 몇 자 분량의 정보 (영문 용어가 섞인 ko/ja 문장이 en으로 분류되지 않도록)
+CJK_CHAR_WEIGHT = 3
+
+
+def detect_text_language(text: str, default: str = "en") -> str:
+    """문의 텍스트의 언어 판별 (en/ja/ko, 유니코드 블록 기준)
+
+    - 가나가 있으면 ja, 한글이 있으면 ko (한자는 가나/한글 중 많은 쪽에 합산, 둘 다 없으면 ja)
+    - 여러 문자가 섞이면 가중 글자 수가 가장 많은 언어 ("강남 rhinoplasty 가격" → ko)
+    - 글자가 없으면 default
+    """
+    if not text:
+        return default
+    if text.isascii():
+        return "en" if any(ch.isalpha() for ch in text) else default
+
+    hangul = len(_HANGUL_CHAR_RE.findall(text))
+    kana = len(_KANA_CHAR_RE.findall(text))
+    han = len(_HAN_CHAR_RE.findall(text))
+    latin = len(_LATIN_CHAR_RE.findall(text))
+
+    if han:
+        if hangul > kana:
+            hangul += han
+        else:
+            kana += han
+    scores = (
+        (kana * CJK_CHAR_WEIGHT, "ja"),
+        (hangul * CJK_CHAR_WEIGHT, "ko"),
+        (latin, "en"),
+    )
+    score, lang = max(scores, key=lambda x: x[0])
+    return lang if score > 0 else default
+
+
+def detect_text_languages(texts: Iterable[str], default: str = "en") -> List[str]:
+    """detect_text_language 배치 버전 (같은 텍스트는 1번만 판별)"""
+    seen: Dict[str, str] = {}
+    out = []
+    for text in texts:
+        lang = seen.get(text)
+        if lang is None:
+            lang = seen[text] = detect_text_language(text, default)
+        out.append(lang)
+    return out
+
+
+def resolve_language(lang: Optional[str], text: str = "") -> str:
+    """언어 코드가 있으면 코드 기준, 없으면 텍스트로 판별"""
+    if lang and lang.strip():
+        return detect_language(lang)
+    return detect_text_language(text)
+
+
+# ============================================================================
+# 계측 (단계별 지연 시간)
+# ============================================================================
+
+# 평가 파이프라인 단계 (CSV 컬럼: latency_<stage>_ms)
+LATENCY_STAGES = ["normalize", "retrieval", "context", "baseline_llm", "rag_llm"]
+
+# 현재 처리 중인 문의의 측정값 (asyncio.to_thread가 context를 스레드로 복사하므로 두 arm이 같은 dict에 기록)
+_inquiry_metrics: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "inquiry_metrics", default=None
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """단계 소요 시간(ms)을 현재 문의의 측정값에 기록"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _inquiry_metrics.get()
+        if metrics is not None:
+            metrics[f"latency_{stage}_ms"] = (time.perf_counter() - start) * 1000
+
+
+def record_inquiry_metric(key: str, value: Any):
+    """현재 문의의 측정값에 값 기록 (평가 중이 아니면 무시)"""
+    metrics = _inquiry_metrics.get()
+    if metrics is not None:
+        metrics[key] = value
+
+
+class QuantileSketch:
+    """스트리밍 분위수 스케치 (로그 스케일 버킷, DDSketch 방식)
+
+    값 범위에 따라 버킷 수만 늘어나므로 샘플 수와 무관하게 메모리가 일정함
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float):
+        self.count += 1
+        if value <= 1e-9:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # 버킷 (gamma^(i-1), gamma^i]의 대표값
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+# ============================================================================
+# LLM 클라이언트 풀
+# ============================================================================
+
+class ConnectionStats:
+    """HTTP 연결 재사용 카운터 (httpx/httpcore trace 이벤트 기반)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+
+    def on_request(self, request: httpx.Request):
+        """httpx request hook: 요청마다 trace 콜백 등록"""
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    def _trace(self, event_name: str, info: Dict[str, Any]):
+        # 새 TCP 연결/TLS 핸드셰이크가 일어날 때만 이벤트가 발생
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections_opened += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            reused = max(0, self.requests - self.connections_opened)
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "tls_handshakes": self.tls_handshakes,
+                "reused": reused,
+                "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            }
+
+
+LLM_CONNECTION_STATS = ConnectionStats()
+_llm_clients: Dict[str, Any] = {}
+_llm_clients_lock = threading.Lock()
+
+
+def get_llm_client(provider: str = LLM_PROVIDER, pool_size: int = EVAL_CONCURRENCY):
+    """프로바이더별 LLM 클라이언트 (프로세스당 1번만 생성해서 재사용)
+
+    - openai: keep-alive 연결 풀을 동시 실행 수에 맞춘 httpx 클라이언트 공유
+    - google: genai.configure 1회 + GenerativeModel 재사용 (gRPC 채널 공유)
+    """
+    with _llm_clients_lock:
+        client = _llm_clients.get(provider)
+        if client is not None:
+            return client
+
+        if provider == "google":
+            genai.configure(api_key=GOOGLE_GENERATIVE_AI_API_KEY)
+            client = genai.GenerativeModel(LLM_MODELS["google"])
+        else:
+            pool_size = max(1, pool_size)
+            http_client = DefaultHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size,
+                    keepalive_expiry=60.0,
+                ),
+                event_hooks={"request": [LLM_CONNECTION_STATS.on_request]},
+            )
+            client = OpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
+
+        _llm_clients[provider] = client
+        return client
+
+
+def print_connection_stats():
+    """LLM 연결 재사용 통계 출력"""
+    if "openai" in _llm_clients:
+        st = LLM_CONNECTION_STATS.snapshot()
+        print(
+            f"\n🔌 OpenAI connections: requests={st['requests']}, "
+            f"opened={st['connections_opened']}, tls_handshakes={st['tls_handshakes']}, "
+            f"reused={st['reused']} ({st['reuse_ratio']*100:.1f}%)"
+        )
+    if "google" in _llm_clients:
+        print("\n🔌 Google: GenerativeModel created once (gRPC channel reused)")
+
+
+# ============================================================================
+# LLM 응답 캐시 (SQLite)
+# ============================================================================
+
+class ResponseCache:
+    """SQLite 기반 LLM 응답 캐시
+
+    - 키: (provider, model, system prompt, user message)의 SHA-256
+    - 용량 초과 시 가장 오래 사용하지 않은 항목부터 삭제 (LRU)
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS llm_responses_last_access_idx ON llm_responses (last_access)"
+        )
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_responses"
+        ).fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(provider: str, model: str, system_prompt: str, user_message: str) -> str:
+        payload = json.dumps([provider, model, system_prompt, user_message], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE llm_responses SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, response: str):
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # 매번 1건씩 지우지 않도록 용량의 90%까지 한 번에 정리
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM llm_responses ORDER BY last_access LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= target:
+                    break
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """LLM 응답 캐시 (LLM_CACHE_PATH가 비어 있으면 None)"""
+    global _response_cache
+    if not LLM_CACHE_PATH:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(LLM_CACHE_PATH, int(LLM_CACHE_MAX_MB * 1024 * 1024))
+        return _response_cache
+
+
+def print_cache_stats():
+    """LLM 응답 캐시 통계 출력"""
+    if _response_cache is None:
+        return
+    st = _response_cache.stats()
+    print(
+        f"\n💾 LLM cache: hits={st['hits']}, misses={st['misses']} "
+        f"({st['hit_rate']*100:.1f}% hit), entries={st['entries']}, "
+        f"size={st['bytes']/1024/1024:.1f}MB, evictions={st['evictions']}"
+    )
+
+
+# ============================================================================
+# 구조화 추출 (사전 + 다중 패턴 매칭, LLM 호출 없음)
+# ============================================================================
+# normalized_inquiries 필드 규칙은 src/lib/intakeSchema.ts / src/lib/intakeExtract.ts와 동일
+
+# 시술 사전: slug → (body_part, en/ja/ko 별칭)
+# body_part는 intakeExtract.ts BODY_PART_KEYWORDS와 같은 값 사용
+TREATMENT_ALIASES: Dict[str, Tuple[Optional[str], List[str]]] = {
+    "rhinoplasty": ("nose", [
+        "rhinoplasty", "nose job", "nose surgery", "nose reshaping",
+        "鼻形成", "鼻整形", "隆鼻",
+        "코 성형", "코성형", "코 수술", "코수술",
+    ]),
+    "dental-implant": ("dental", [
+        "dental implant", "dental implants", "tooth implant",
+        "インプラント", "歯科インプラント",
+        "임플란트", "치아 임플란트",
+    ]),
+    "breast-augmentation": ("breast", [
+        "breast augmentation", "breast surgery", "breast implants", "boob job",
+        "豊胸", "豊胸手術",
+        "가슴 성형", "가슴 수술", "가슴 확대",
+    ]),
+    "skin-care": ("skin", [
+        "skin treatment", "skin treatments", "skin care", "skincare", "facial",
+        "スキンケア", "肌治療",
+        "피부 관리", "피부 치료", "피부과",
+    ]),
+    "hair-transplant": ("hair", [
+        "hair transplant", "hair transplantation", "hair restoration",
+        "植毛", "毛髪移植",
+        "모발 이식", "모발이식", "탈모 치료",
+    ]),
+    "lasik": ("eye", [
+        "lasik", "lasek", "laser eye surgery", "vision correction",
+        "レーシック", "視力矯正",
+        "라식", "라섹", "시력 교정",
+    ]),
+    "facelift": (None, [
+        "facelift", "face lift", "thread lift",
+        "フェイスリフト", "リフトアップ",
+        "리프팅", "안면 거상",
+    ]),
+    "liposuction": ("abdomen", [
+        "liposuction", "lipo",
+        "脂肪吸引",
+        "지방흡입", "지방 흡입",
+    ]),
+    "tummy-tuck": ("abdomen", [
+        "tummy tuck", "abdominoplasty",
+        "腹部整形",
+        "복부 성형", "복부 거상",
+    ]),
+    "botox": ("skin", [
+        "botox", "botulinum",
+        "ボトックス",
+        "보톡스",
+    ]),
+    "filler": ("skin", [
+        "filler", "fillers", "dermal filler",
+        "ヒアルロン酸", "フィラー",
+        "필러",
+    ]),
+    "chin-augmentation": ("chin", [
+        "chin augmentation", "chin surgery", "jaw surgery", "v-line",
+        "あごの整形", "顎の整形", "輪郭形成",
+        "턱 성형", "턱 수술", "윤곽 수술",
+    ]),
+    "double-eyelid": ("eye", [
+        "double eyelid", "eyelid surgery", "blepharoplasty",
+        "二重まぶた", "二重整形", "まぶた",
+        "쌍꺼풀", "쌍커풀", "눈 성형",
+    ]),
+}
+
+# 지역 사전: 정규화 이름 → 별칭
+PLACE_ALIASES: Dict[str, List[str]] = {
+    "seoul": ["seoul", "ソウル", "서울"],
+    "gangnam": ["gangnam", "江南", "강남"],
+    "apgujeong": ["apgujeong", "狎鴎亭", "압구정"],
+    "sinsa": ["sinsa", "新沙", "신사"],
+    "myeongdong": ["myeongdong", "明洞", "명동"],
+    "busan": ["busan", "釜山", "부산"],
+    "jeju": ["jeju", "済州", "제주"],
+    "korea": ["korea", "south korea", "韓国", "한국"],
+}
+
+# 문의 목적 (intake.goal / normalized_inquiries.objective), 앞에 있을수록 우선
+OBJECTIVE_ALIASES: Dict[str, List[str]] = {
+    "price": ["cost", "costs", "price", "prices", "pricing", "how much", "費用", "値段", "料金", "いくら", "비용", "가격", "얼마예요", "얼마인가요", "얼마 정도"],
+    "risk": ["risk", "risks", "side effect", "side effects", "complication", "リスク", "副作用", "위험", "부작용"],
+    "recovery": ["recovery", "downtime", "aftercare", "post-surgery", "回復", "ダウンタイム", "術後", "회복", "수술 후", "사후 관리"],
+    "consultation": ["consultation", "consult", "相談", "カウンセリング", "상담"],
+    "visa": ["visa", "documents", "ビザ", "書類", "비자", "서류"],
+    "package": ["package", "packages", "パッケージ", "패키지"],
+    "find_provider": ["clinic", "clinics", "hospital", "hospitals", "doctor", "病院", "クリニック", "병원", "의원"],
+}
+OBJECTIVE_PRIORITY = list(OBJECTIVE_ALIASES)
+
+# 금기/복용 정보 (intakeExtract.ts CONTRAINDICATION_KEYWORDS와 같은 라벨)
+CONTRAINDICATION_ALIASES: Dict[str, List[str]] = {
+    "allergy": ["allergy", "allergic", "アレルギー", "알레르기", "알러지"],
+    "medication": ["medication", "medicine", "meds", "drug", "服用", "薬", "복용", "약을"],
+    "diabetes": ["diabetes", "diabetic", "糖尿病", "당뇨"],
+    "pregnant": ["pregnant", "pregnancy", "妊娠", "임신"],
+}
+
+# 예산: 금액 + 통화 (intakeExtract.ts extractBudgetFromQuery처럼 매칭 문자열을 그대로 저장)
+_BUDGET_RE = re.compile(
+    r"(?:[$₩¥]\s?\d[\d,.]*\s?(?:k|m|million|thousand)?)"
+    r"|(?:\d[\d,.]*\s?(?:k|m|million|thousand)?\s?(?:usd|dollars?|krw|won|jpy|yen)\b)"
+    r"|(?:\d[\d,.]*\s?(?:万円|円|万ウォン|ウォン|ドル))"
+    r"|(?:\d[\d,.]*\s?(?:만\s?원|천\s?원|원|달러|엔))"
+)
+_BUDGET_HINT_RE = re.compile(r"\bbudget\b|予算|예산")
+
+# 일정 (extractTimelineFromQuery 값: asap / 1-3m / 3-6m / 6m+ / preferred_date:YYYY-MM-DD)
+_TIMELINE_PATTERNS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"\basap\b|as soon as possible|urgent|できるだけ早く|至急|急ぎ|가능한 빨리|최대한 빨리|급하"), "asap"),
+    (re.compile(r"(?<!\d)1-3\s*months?|(?<!\d)1\s*to\s*3\s*m|within 3\s*m|next month|来月|(?<!\d)1[〜~-]3\s*ヶ?か?月|다음 ?달|(?<!\d)1[~-]3\s*개월"), "1-3m"),
+    (re.compile(r"(?<!\d)3-6\s*months?|(?<!\d)3\s*to\s*6\s*m|(?<!\d)3[〜~-]6\s*ヶ?か?月|(?<!\d)3[~-]6\s*개월"), "3-6m"),
+    (re.compile(r"(?<!\d)6\s*months|(?<!\d)6m\+|(?<!\d)6m\s*plus|next year|来年|半年後|내년|(?<!\d)6\s*개월 ?후"), "6m+"),
+]
+_DATE_PATTERNS: List[Tuple[re.Pattern, Tuple[int, int, int]]] = [
+    (re.compile(r"\b(20\d{2})-(\d{1,2})-(\d{1,2})\b"), (1, 2, 3)),
+    (re.compile(r"\b(\d{1,2})/(\d{1,2})/(20\d{2})\b"), (3, 1, 2)),
+    (re.compile(r"(?<!\d)(20\d{2})年\s*(\d{1,2})月\s*(\d{1,2})日"), (1, 2, 3)),
+    (re.compile(r"(?<!\d)(20\d{2})\s*년\s*(\d{1,2})\s*월\s*(\d{1,2})\s*일"), (1, 2, 3)),
+]
+
+# 증상 기간 / 정도 (extractDurationFromQuery / extractSeverityFromQuery 값)
+# 숫자로 시작하는 패턴은 (?<!\d)로 앞 숫자를 막음 ("11개월" ≠ 1개월, "2021년" ≠ 1년)
+_DURATION_PATTERNS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"\b1w\b|(?<!\d)1\s*week|(?<!\d)1週間|(?<!\d)1\s*주"), "1w"),
+    (re.compile(r"\b1m\b|(?<!\d)1\s*month|(?<!\d)1ヶ月|(?<!\d)1か月|(?<!\d)1\s*개월|한 ?달"), "1m"),
+    (re.compile(r"\b3m\b|(?<!\d)3\s*month|(?<!\d)3ヶ月|(?<!\d)3か月|(?<!\d)3\s*개월"), "3m"),
+    (re.compile(r"\b6m\b|(?<!\d)6\s*month|(?<!\d)6ヶ月|(?<!\d)6か月|(?<!\d)6\s*개월"), "6m"),
+    (re.compile(r"\b1y\b|(?<!\d)1\s*year|(?<!\d)1y\+|(?<!\d)1年|(?<!\d)1\s*년"), "1y+"),
+]
+_SEVERITY_PATTERNS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"\bmild\b|\bminor\b|\bslight|軽い|軽度|가벼운|경미"), "mild"),
+    (re.compile(r"\bmedium\b|\bmoderate\b|中程度|중간 정도|중등도"), "medium"),
+    (re.compile(r"\bsevere\b|\bserious\b|\bbad\b|ひどい|重度|심한|심각"), "severe"),
+]
+_SEVERITY_SCALE_RE = re.compile(r"\b(?:[0-9]|10)\s*/\s*10\b|\b(?:[0-9]|10)-10\b")
+
+# intakeSchema.ts REQUIRED_KEYS (missing_fields / extraction_confidence 기준)
+INTAKE_REQUIRED_KEYS = ["goal", "chief_complaint", "body_part", "timeline", "budget", "attachments_present"]
+
+
+def _is_ascii_word_char(ch: str) -> bool:
+    return ch.isascii() and (ch.isalnum() or ch == "_")
+
+
+class AhoCorasick:
+    """다중 패턴 문자열 매칭 (모든 별칭을 입력 길이에 비례하는 1회 순회로 찾음)
+
+    - 입력/패턴 모두 NFKC + 소문자 + 공백 1칸으로 정규화
+    - ASCII 단어로 시작/끝나는 패턴은 단어 경계에서만 매칭 ("lipo" ≠ "lipoma"의 일부가 아니도록)
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, Any]]] = [[]]  # (패턴 길이, 값)
+        self._built = False
+        self.patterns = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(unicodedata.normalize("NFKC", text or "").lower().split())
+
+    def add(self, pattern: str, value: Any):
+        pattern = self.normalize(pattern)
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern), value))
+        self.patterns += 1
+        self._built = False
+
+    def build(self):
+        """실패 링크 계산 (BFS)"""
+        queue = list(self._goto[0].values())
+        for node in queue:
+            self._fail[node] = 0
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._built = True
+
+    def find(self, text: str, normalized: bool = False) -> List[Tuple[int, int, Any]]:
+        """(start, end, value) 목록 (start 순, 같은 위치면 긴 패턴 먼저)"""
+        if not self._built:
+            self.build()
+        if not normalized:
+            text = self.normalize(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        node = 0
+        n = len(text)
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            end = i + 1
+            for length, value in out[node]:
+                start = end - length
+                if _is_ascii_word_char(text[start]) and start > 0 and _is_ascii_word_char(text[start - 1]):
+                    continue
+                if _is_ascii_word_char(text[i]) and end < n and _is_ascii_word_char(text[end]):
+                    continue
+                matches.append((start, end, value))
+        matches.sort(key=lambda m: (m[0], m[0] - m[1]))
+        return matches
+
+
+def _first_pattern(text: str, patterns: List[Tuple[re.Pattern, str]]) -> Optional[str]:
+    for pattern, label in patterns:
+        if pattern.search(text):
+            return label
+    return None
+
+
+def _extract_timeline(text: str) -> Optional[str]:
+    timeline = _first_pattern(text, _TIMELINE_PATTERNS)
+    if timeline:
+        return timeline
+    for pattern, (yi, mi, di) in _DATE_PATTERNS:
+        m = pattern.search(text)
+        if m:
+            year, month, day = int(m.group(yi)), int(m.group(mi)), int(m.group(di))
+            if 1 <= month <= 12 and 1 <= day <= 31:
+                return f"preferred_date:{year:04d}-{month:02d}-{day:02d}"
+    return None
+
+
+def _extract_budget(text: str, price_mentioned: bool) -> Optional[str]:
+    m = _BUDGET_RE.search(text)
+    if m:
+        return m.group(0).strip()[:50]
+    if price_mentioned or _BUDGET_HINT_RE.search(text):
+        return "mentioned"
+    return None
+
+
+def _extract_severity(text: str) -> Optional[str]:
+    severity = _first_pattern(text, _SEVERITY_PATTERNS)
+    if severity:
+        return severity
+    m = _SEVERITY_SCALE_RE.search(text)
+    return m.group(0)[:20] if m else None
+
+
+class IntakeExtractor:
+    """사전 기반 구조화 추출 (normalized_inquiries 필드 채우기)
+
+    시술/지역/목적/금기 별칭을 하나의 AhoCorasick로 묶어서 1회 순회,
+    예산/일정/기간/정도는 정규식. 문의 1건당 수십 µs.
+    """
+
+    def __init__(self):
+        self.matcher = AhoCorasick()
+        self.body_parts: Dict[str, Optional[str]] = {}
+        for slug, (body_part, aliases) in TREATMENT_ALIASES.items():
+            self.add_treatment(slug, aliases, body_part)
+        for place, aliases in PLACE_ALIASES.items():
+            for alias in aliases:
+                self.matcher.add(alias, ("place", place))
+        for objective, aliases in OBJECTIVE_ALIASES.items():
+            for alias in aliases:
+                self.matcher.add(alias, ("objective", objective))
+        for label, aliases in CONTRAINDICATION_ALIASES.items():
+            for alias in aliases:
+                self.matcher.add(alias, ("contraindication", label))
+
+    def add_treatment(self, slug: str, aliases: Iterable[str], body_part: Optional[str] = None):
+        if slug not in self.body_parts or body_part:
+            self.body_parts[slug] = body_part
+        for alias in aliases:
+            self.matcher.add(alias, ("treatment", slug))
+
+    def add_catalog(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """treatments 테이블 행(slug, name)을 별칭으로 추가"""
+        added = 0
+        for row in rows:
+            slug = row.get("slug")
+            if not slug:
+                continue
+            aliases = [slug.replace("-", " ")]
+            if row.get("name"):
+                aliases.append(row["name"])
+            self.add_treatment(slug, aliases, self.body_parts.get(slug))
+            added += 1
+        return added
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        """문의 1건 → {treatment_slug, objective, constraints, missing_fields, extraction_confidence}"""
+        normalized = AhoCorasick.normalize(text)
+
+        found: Dict[str, List[str]] = {"treatment": [], "place": [], "objective": [], "contraindication": []}
+        covered_until = 0
+        for start, end, (kind, value) in self.matcher.find(normalized, normalized=True):
+            # 겹치는 매칭은 먼저 시작하는(같으면 더 긴) 쪽만 사용 ("breast surgery" 안의 "surgery" 등)
+            if start < covered_until:
+                continue
+            covered_until = end
+            if value not in found[kind]:
+                found[kind].append(value)
+
+        treatment_slug = found["treatment"][0] if found["treatment"] else None
+        objective = next((o for o in OBJECTIVE_PRIORITY if o in found["objective"]), None)
+        contraindications = found["contraindication"]
+
+        # src/lib/intakeSchema.ts Intake와 같은 키
+        intake = {
+            "goal": objective,
+            "chief_complaint": " ".join((text or "").split())[:300] or None,
+            "body_part": self.body_parts.get(treatment_slug) if treatment_slug else None,
+            "duration": _first_pattern(normalized, _DURATION_PATTERNS),
+            "severity": _extract_severity(normalized),
+            "budget": _extract_budget(normalized, "price" in found["objective"]),
+            "timeline": _extract_timeline(normalized),
+            "contraindications": contraindications or None,
+            "medical_history_flag": None,
+            "medications_flag": ("medication" in contraindications) or None,
+            "allergy_flag": ("allergy" in contraindications) or None,
+            "previous_procedure_flag": None,
+            "attachments_present": False,
+        }
+
+        missing_fields = [
+            key for key in INTAKE_REQUIRED_KEYS
+            if intake[key] is None or (isinstance(intake[key], str) and not intake[key].strip())
+        ]
+        filled = len(INTAKE_REQUIRED_KEYS) - len(missing_fields)
+        extraction_confidence = min(1.0, round(filled / len(INTAKE_REQUIRED_KEYS), 2)) if filled > 0 else 0.0
+
+        return {
+            "treatment_slug": treatment_slug,
+            "objective": objective,
+            "constraints": {
+                "intake": intake,
+                "meta": {
+                    "pipeline_version": "v1",
+                    "source_type": "ai_agent",
+                    "model": None,
+                    "prompt_version": None,
+                    "extractor": "dictionary",
+                },
+                "treatments": found["treatment"],
+                "places": found["place"],
+            },
+            "missing_fields": missing_fields or None,
+            "extraction_confidence": extraction_confidence,
+        }
+
+
+_intake_extractor: Optional[IntakeExtractor] = None
+_intake_extractor_lock = threading.Lock()
+
+
+def get_intake_extractor(supabase: Optional[Client] = None) -> IntakeExtractor:
+    """프로세스당 1개의 추출기 (supabase가 있으면 treatments 카탈로그도 별칭에 추가)"""
+    global _intake_extractor
+    with _intake_extractor_lock:
+        if _intake_extractor is None:
+            extractor = IntakeExtractor()
+            if supabase is not None:
+                try:
+                    added = extractor.add_catalog(iter_table_rows(supabase, "treatments", "id, slug, name"))
+                    print(f"[Extract] {added} treatments loaded from catalog")
+                except Exception as e:
+                    print(f"[Extract] Error: {str(e)} (built-in dictionary only)")
+            extractor.matcher.build()
+            _intake_extractor = extractor
+        return _intake_extractor
+
+
+def extract_intake(text: str, supabase: Optional[Client] = None) -> Dict[str, Any]:
+    """문의 텍스트 → normalized_inquiries 구조화 필드 (LLM 호출 없음)"""
+    return get_intake_extractor(supabase).extract(text)
+
+
+# ============================================================================
+# 정규화 기록 (normalized_inquiries write-behind)
+# ============================================================================
+
+# normalized_inquiries.id = uuid5(이 namespace, content_hash) → 같은 문의는 항상 같은 id
+NORMALIZATION_ID_NAMESPACE = uuid.UUID("5f0c6f5e-3c1d-4b8e-9a57-2d6f1c0e8b41")
+
+
+def normalization_content_hash(source_type: str, language: str, raw_message: Optional[str]) -> str:
+    """normalized_inquiries 멱등 키 (migrations/20261018_normalized_inquiries_content_hash.sql)"""
+    normalized = " ".join((raw_message or "").split())
+    return hashlib.sha256(f"{source_type}\n{language}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+class NormalizationWriter:
+    """normalized_inquiries write-behind 큐
+
+    - put(): id(content_hash의 uuid5)/content_hash를 채운 레코드를 큐에 넣고 바로 반환 (DB 왕복 없음,
+      created_at은 DB 기본값)
+    - 최근 dedupe_size개 content_hash는 다시 큐에 넣지 않고 처음 큐에 넣은 레코드를 그대로 반환 (LRU);
+      그보다 오래된 중복과 다른 프로세스가 쓴 행은 DB의 ON CONFLICT (content_hash)가 기존 행을 유지하므로
+      이때 반환값(CSV의 normalized_data)은 DB 행과 다를 수 있음 — DB 행이 기준
+    - 백그라운드 스레드가 flush_size건이 모이거나 flush_seconds가 지나면 multi-row upsert
+    - 실패한 배치는 몇 번 재시도 후 버림 (failed로 집계)
+    - close() 또는 프로세스 종료(atexit) 시 남은 레코드를 모두 기록
+    """
+
+    def __init__(
+        self,
+        supabase: Client,
+        flush_size: int = NORMALIZE_FLUSH_SIZE,
+        flush_seconds: float = NORMALIZE_FLUSH_SECONDS,
+        table: str = "normalized_inquiries",
+        max_retries: int = 3,
+        dedupe_size: int = NORMALIZE_DEDUPE_SIZE,
+    ):
+        self.supabase = supabase
+        self.flush_size = max(1, flush_size)
+        self.flush_seconds = flush_seconds
+        self.table = table
+        self.max_retries = max_retries
+        self._buffer: List[Dict[str, Any]] = []
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._flush_requested = False
+        self.dedupe_size = max(0, dedupe_size)
+        self._seen: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # content_hash -> 처음 큐에 넣은 레코드 (LRU)
+
+        self.queued = 0
+        self.deduplicated = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+        self._thread = threading.Thread(target=self._run, name="normalization-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        content_hash = record.get("content_hash") or normalization_content_hash(
+            record.get("source_type") or "", record.get("language") or "", record.get("raw_message")
+        )
+        record = {
+            "id": str(uuid.uuid5(NORMALIZATION_ID_NAMESPACE, content_hash)),
+            **record,
+            "content_hash": content_hash,
+        }
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("NormalizationWriter is closed")
+            first = self._seen.get(content_hash)
+            if first is not None:
+                self._seen.move_to_end(content_hash)
+                self.deduplicated += 1
+                return first
+            if self.dedupe_size:
+                self._seen[content_hash] = record
+                if len(self._seen) > self.dedupe_size:
+                    self._seen.popitem(last=False)
+            self._buffer.append(record)
+            self.queued += 1
+            if len(self._buffer) >= self.flush_size:
+                self._cond.notify_all()
+        return record
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_seconds
+                while not (self._closed or self._flush_requested) and len(self._buffer) < self.flush_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._buffer[:self.flush_size]
+                del self._buffer[:len(batch)]
+                self._in_flight += len(batch)
+                if not self._buffer:
+                    self._flush_requested = False
+                if not batch and self._closed:
+                    self._cond.notify_all()
+                    return
+
+            if batch:
+                self._write(batch)
+            with self._cond:
+                self._in_flight -= len(batch)
+                self._cond.notify_all()
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                call_with_rate_limit("supabase", self.supabase.table(self.table).upsert(
+                    batch, on_conflict="content_hash", ignore_duplicates=True
+                ).execute)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += len(batch)
+                    print(f"[Normalize] Flush Error ({len(batch)} rows dropped): {str(e)}")
+                    return
+                time.sleep(min(10.0, 0.5 * 2 ** attempt))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """지금까지 put한 레코드가 모두 기록될 때까지 대기"""
+        with self._cond:
+            # 버퍼가 flush_size보다 작아도 타이머를 기다리지 않고 바로 기록
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._buffer and not self._in_flight, timeout)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queued": self.queued,
+                "deduplicated": self.deduplicated,
+                "written": self.written,
+                "failed": self.failed,
+                "batches": self.batches,
+                "pending": len(self._buffer) + self._in_flight,
+            }
+
+
+_normalization_writer: Optional[NormalizationWriter] = None
+_normalization_writer_lock = threading.Lock()
+
+
+def get_normalization_writer(supabase: Client) -> NormalizationWriter:
+    """프로세스당 1개의 write-behind 큐 (close 후에는 새로 생성)"""
+    global _normalization_writer
+    with _normalization_writer_lock:
+        if _normalization_writer is None or _normalization_writer._closed:
+            _normalization_writer = NormalizationWriter(supabase)
+        return _normalization_writer
+
+
+def close_normalization_writer():
+    """남은 정규화 레코드를 모두 기록"""
+    if _normalization_writer is not None:
+        _normalization_writer.close()
+
+
+def print_normalization_stats():
+    """normalized_inquiries 기록 통계 출력"""
+    if _normalization_writer is None:
+        return
+    st = _normalization_writer.stats()
+    print(
+        f"\n📝 normalized_inquiries: written={st['written']} in {st['batches']} batches "
+        f"(existing rows kept on conflict), deduplicated={st['deduplicated']}, failed={st['failed']}"
+    )
+
+
 # ============================================================================
 # LLM 호출
 # ============================================================================
 
+def call_llm(system_prompt: str, inquiry: str) -> str:
+    """LLM 호출 (응답 캐시 확인 후 LLM_PROVIDER별 Rate Limiter 적용)"""
+    cache = get_response_cache()
+    cache_key = None
+    if cache is not None:
+        # google 외의 프로바이더는 아래에서 OpenAI 경로로 호출되므로 같은 키를 사용
+        provider = "google" if LLM_PROVIDER == "google" else "openai"
+        cache_key = ResponseCache.make_key(
+            provider, LLM_MODELS[provider], system_prompt, inquiry
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    client = get_llm_client(LLM_PROVIDER)
+
+    if LLM_PROVIDER == "google":
+        response = call_with_rate_limit(
+            "google",
+            client.generate_content,
+            f"{system_prompt}\n\nUser: {inquiry}\n\nAssistant:",
+        )
+        text = response.text
+    else:
+        response = call_with_rate_limit(
+            "openai",
+            client.chat.completions.create,
+            model=LLM_MODELS["openai"],
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": inquiry},
+            ],
+        )
+        text = response.choices[0].message.content
+
+    # 오류는 예외로 올라가므로 정상 응답만 캐시됨
+    if cache is not None and isinstance(text, str):
+        cache.put(cache_key, text)
+    return text
+
+
 def get_baseline_response(inquiry: str, lang: str) -> str:
     """일반 LLM 응답 (RAG 없이)"""
     system_prompt = """You are a medical concierge assistant for HEALO.
@@ -159,100 +1318,275 @@ Ask clarifying questions when constraints are missing.
 Primary objective: guide the user to submit an inquiry."""
 
     try:
-        if LLM_PROVIDER == "google":
-            genai.configure(api_key=GOOGLE_GENERATIVE_AI_API_KEY)
-            model = genai.GenerativeModel("gemini-2.0-flash")
-            response = model.generate_content(
-                f"{system_prompt}\n\nUser: {inquiry}\n\nAssistant:"
-            )
-            return response.text
-        else:
-            client = OpenAI(api_key=OPENAI_API_KEY)
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": inquiry},
-                ],
-            )
-            return response.choices[0].message.content
+        with stage_timer("baseline_llm"):
+            return call_llm(system_prompt, inquiry)
     except Exception as e:
         print(f"[Baseline] Error: {str(e)}")
         return f"[ERROR: {str(e)}]"
 
 
 def get_rag_response(inquiry: str, lang: str, supabase: Client) -> Tuple[str, str, Dict]:
-    """HEALO RAG + 정규화 응답"""
+    """HEALO RAG + 정규화 응답 (lang이 비어 있으면 문의 텍스트로 언어 판별)"""
+    language = resolve_language(lang, inquiry)
+
     # 1. 정규화
     normalized = None
     try:
-        language = detect_language(lang)
-        result = supabase.table("normalized_inquiries").insert({
-            "source_type": "ai_agent",
-            "language": language,
-            "raw_message": inquiry,
-            "constraints": {},
-            "treatment_slug": None,
-            "objective": None,
-        }).execute()
-        if result.data:
-            normalized = result.data[0]
+        # 검색에는 필요 없으므로 큐에 넣고 바로 진행 (배치로 나중에 기록)
+        with stage_timer("normalize"):
+            normalized = get_normalization_writer(supabase).put({
+                "source_type": "ai_agent",
+                "language": language,
+                "raw_message": inquiry,
+                **extract_intake(inquiry, supabase),
+            })
     except Exception as e:
         print(f"[Normalize] Error: {str(e)}")
     
     # 2. RAG 검색
-    rag_chunks = search_rag(inquiry, lang, supabase)
-    context = build_context(rag_chunks)
+    with stage_timer("retrieval"):
+        rag_chunks = search_rag(inquiry, language, supabase)
+    with stage_timer("context"):
+        context = build_context(rag_chunks)
     
     # 3. LLM 응답 (RAG 컨텍스트 포함)
+    # f-string 표현식 안에 백슬래시를 넣으면 Python 3.12 미만에서 SyntaxError
+    context_section = f"Context:\n{context}" if context else ""
     system_prompt = f"""You are a medical concierge assistant for HEALO.
 Do not provide diagnosis, medical advice, or guarantees.
 Ask clarifying questions when constraints are missing.
 Primary objective: guide the user to submit an inquiry.
 If relevant, reference the provided context briefly.
 
-{('Context:\n' + context) if context else ''}"""
+{context_section}"""
 
     try:
-        if LLM_PROVIDER == "google":
-            genai.configure(api_key=GOOGLE_GENERATIVE_AI_API_KEY)
-            model = genai.GenerativeModel("gemini-2.0-flash")
-            response = model.generate_content(
-                f"{system_prompt}\n\nUser: {inquiry}\n\nAssistant:"
-            )
-            response_text = response.text
-        else:
-            client = OpenAI(api_key=OPENAI_API_KEY)
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": inquiry},
-                ],
-            )
-            response_text = response.choices[0].message.content
-        
+        with stage_timer("rag_llm"):
+            response_text = call_llm(system_prompt, inquiry)
         return response_text, context, normalized or {}
     except Exception as e:
         print(f"[RAG] Error: {str(e)}")
         return f"[ERROR: {str(e)}]", context, normalized or {}
 
 
-def search_rag(query: str, lang: str, supabase: Client) -> List[Dict]:
-    """RAG 검색"""
+# DB에 없는 것으로 확인된 RPC (매 호출마다 실패하지 않도록 기억)
+_missing_rpcs: set = set()
+
+
+def search_rag(
+    query: str,
+    lang: str,
+    supabase: Client,
+    k: int = RAG_TOP_K,
+    backend: str = RAG_BACKEND,
+) -> List[Dict]:
+    """RAG 검색 (같은 질문은 검색 결과 캐시에서 반환, 문서가 바뀌면 무효화)"""
+    cache = get_retrieval_cache()
+    if cache is None:
+        return _search_rag_backend(query, lang, supabase, k, backend)
+
+    if backend != "local":
+        # local 인덱스는 적재 시점(또는 스냅샷)으로 고정이라 재검증 불필요
+        cache.maybe_revalidate(supabase)
+    key = cache.make_key(query, lang, k, backend)
+    generation = cache.generation()
+    chunks = cache.get(key)
+    if chunks is None:
+        chunks = _search_rag_backend(query, lang, supabase, k, backend)
+        cache.put(key, lang, chunks, generation)
+    return chunks
+
+
+def search_rag_many(
+    queries: List[str],
+    lang: Any,
+    supabase: Client,
+    k: int = RAG_TOP_K,
+    backend: str = RAG_BACKEND,
+) -> List[List[Dict]]:
+    """질문 여러 개를 한 번에 검색 (결과 순서 = queries 순서)
+
+    - lang: 모든 질문에 같은 언어(str/None) 또는 질문별 언어 목록
+    - rpc: search_rag_chunks_many로 RAG_MANY_BATCH_SIZE개씩 1번의 요청
+      (함수가 없거나 다른 backend면 질문별 search_rag)
+    - 검색 결과 캐시에 있는 질문은 다시 조회하지 않고, 새로 조회한 결과는 캐시에 저장
+    """
+    langs = list(lang) if isinstance(lang, (list, tuple)) else [lang] * len(queries)
+    results: List[Optional[List[Dict]]] = [None] * len(queries)
+
+    cache = get_retrieval_cache()
+    generation = None
+    if cache is not None:
+        if backend != "local":
+            cache.maybe_revalidate(supabase)
+        generation = cache.generation()
+        for i, (query, query_lang) in enumerate(zip(queries, langs)):
+            results[i] = cache.get(cache.make_key(query, query_lang, k, backend))
+
+    # 같은 질문은 1번만 조회 (정규화한 키 기준)
+    duplicates: Dict[int, List[int]] = {}
+    first_by_key: Dict[Tuple, int] = {}
+    for i, r in enumerate(results):
+        if r is None:
+            key = RetrievalCache.make_key(queries[i], langs[i], k, backend)
+            first = first_by_key.setdefault(key, i)
+            duplicates.setdefault(first, []).append(i)
+    missing = list(duplicates)
+
+    if missing and backend == "rpc" and RAG_SEARCH_MANY_RPC not in _missing_rpcs:
+        for start in range(0, len(missing), RAG_MANY_BATCH_SIZE):
+            batch = missing[start:start + RAG_MANY_BATCH_SIZE]
+            try:
+                result = call_with_rate_limit("supabase", supabase.rpc(RAG_SEARCH_MANY_RPC, {
+                    "query_texts": [queries[i] for i in batch],
+                    "query_langs": [langs[i] or None for i in batch],
+                    "match_count": k,
+                }).execute)
+            except Exception as e:
+                if _is_missing_rpc_error(e):
+                    _missing_rpcs.add(RAG_SEARCH_MANY_RPC)
+                    print(f"[RAG Search] {RAG_SEARCH_MANY_RPC}() not found, searching one query at a time "
+                          "(apply migrations/20261018_add_rag_search_many_rpc.sql)")
+                else:
+                    print(f"[RAG Search] Batch RPC Error: {str(e)}")
+                break
+
+            grouped: Dict[int, List[Dict]] = {i: [] for i in batch}
+            for row in result.data or []:
+                grouped[batch[row["query_index"]]].append(_rpc_row_to_chunk(row))
+            for i, chunks in grouped.items():
+                results[i] = chunks
+                if cache is not None:
+                    cache.put(cache.make_key(queries[i], langs[i], k, backend), langs[i], chunks, generation)
+
+    for first, same in duplicates.items():
+        if results[first] is None:
+            results[first] = search_rag(queries[first], langs[first], supabase, k, backend)
+        for i in same:
+            results[i] = list(results[first])
+    return results
+
+
+def iter_with_rag_prefetch(
+    inquiries: Iterable[Dict[str, Any]],
+    supabase: Client,
+    batch_size: int = RAG_PREFETCH_BATCH,
+    skip: Optional[Dict[int, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """문의를 batch_size개씩 묶어 search_rag_many로 미리 검색해 캐시에 채운 뒤 그대로 넘겨줌
+
+    (get_rag_response의 search_rag가 캐시에서 바로 반환되도록. skip에 있는 id는 검색하지 않음)
+    """
+    block: List[Dict[str, Any]] = []
+
+    def flush() -> Iterator[Dict[str, Any]]:
+        todo = [q for q in block if not skip or q["id"] not in skip]
+        if todo:
+            try:
+                search_rag_many(
+                    [q["text"] for q in todo],
+                    [resolve_language(q.get("lang"), q["text"]) for q in todo],
+                    supabase,
+                )
+            except Exception as e:
+                print(f"[RAG Prefetch] Error: {str(e)}")
+        yield from block
+        block.clear()
+
+    for inquiry in inquiries:
+        block.append(inquiry)
+        if len(block) >= batch_size:
+            yield from flush()
+    yield from flush()
+
+
+def _search_rag_backend(
+    query: str,
+    lang: str,
+    supabase: Client,
+    k: int = RAG_TOP_K,
+    backend: str = RAG_BACKEND,
+) -> List[Dict]:
+    """RAG 검색 (캐시 없이 백엔드 호출)
+
+    - rpc: DB 랭킹 함수 (함수가 없으면 ILIKE 검색으로 대체)
+    - local: 메모리 BM25 인덱스 (처음 1번만 DB에서 적재)
+    - vector: 질문 임베딩 + pgvector (set_vector_index로 메모리 인덱스 지정 가능)
+    - hybrid: 키워드 + 벡터를 동시에 검색 후 RRF로 융합
+    """
+    if backend == "hybrid":
+        return _search_rag_hybrid(query, lang, supabase, k)
+
+    if backend == "vector":
+        return _search_rag_vector(query, lang, supabase, k)
+
+    if backend == "local":
+        try:
+            return get_rag_index(supabase).search(query, lang, k)
+        except Exception as e:
+            print(f"[RAG Search] Local index error: {str(e)}")
+            return []
+
+    if RAG_SEARCH_RPC not in _missing_rpcs:
+        try:
+            result = call_with_rate_limit("supabase", supabase.rpc(RAG_SEARCH_RPC, {
+                "query_text": query,
+                "query_lang": lang or None,
+                "match_count": k,
+            }).execute)
+            return [_rpc_row_to_chunk(row) for row in (result.data or [])]
+        except Exception as e:
+            if _is_missing_rpc_error(e):
+                _missing_rpcs.add(RAG_SEARCH_RPC)
+                print(f"[RAG Search] {RAG_SEARCH_RPC}() not found, using ILIKE fallback "
+                      "(apply migrations/20261018_add_rag_search_rpc.sql)")
+            else:
+                print(f"[RAG Search] RPC Error: {str(e)}")
+                return []
+
+    return _search_rag_ilike(query, lang, supabase, k)
+
+
+def _rpc_row_to_chunk(row: Dict[str, Any]) -> Dict[str, Any]:
+    """RPC 결과 행을 rag_chunks + rag_documents(...) 조인 결과와 같은 모양으로 변환"""
+    return {
+        "id": row["id"],
+        "document_id": row["document_id"],
+        "chunk_index": row.get("chunk_index"),
+        "content": row.get("content"),
+        "metadata": row.get("metadata") or {},
+        "rag_documents": {
+            "id": row["document_id"],
+            "source_type": row.get("source_type"),
+            "source_id": row.get("source_id"),
+            "lang": row.get("lang"),
+            "title": row.get("title"),
+            "version": row.get("version"),
+            "updated_at": row.get("updated_at"),
+        },
+        "_score": row.get("score", 0),
+    }
+
+
+def _is_missing_rpc_error(error: Exception) -> bool:
+    """PostgREST: 함수가 없을 때 PGRST202"""
+    return getattr(error, "code", None) == "PGRST202" or "PGRST202" in str(error)
+
+
+def _search_rag_ilike(query: str, lang: str, supabase: Client, k: int = RAG_TOP_K) -> List[Dict]:
+    """RAG 검색 (ILIKE, search_rag_chunks RPC가 없는 DB용)"""
     try:
         # 토큰 추출
-        query_clean = re.sub(r"[^a-z0-9가-힣\s]", " ", query.lower())
-        tokens = [t for t in query_clean.split() if len(t) >= 3][:6]
+        tokens = list(dict.fromkeys(tokenize(query)))[:6]
         
         if not tokens:
             tokens = [query]
         
         # Supabase 쿼리 (간단한 버전)
         # 실제로는 더 복잡한 쿼리가 필요하지만, 여기서는 기본 구조만
-        result = supabase.table("rag_chunks").select(
-            "id, document_id, chunk_index, content, metadata, rag_documents(id, source_type, source_id, lang, title)"
-        ).ilike("content", f"%{query}%").limit(6).execute()
+        result = call_with_rate_limit("supabase", supabase.table("rag_chunks").select(
+            RAG_CHUNK_SELECT
+        ).ilike("content", f"%{query}%").limit(k).execute)
         
         if lang:
             # 언어 필터링은 클라이언트 측에서
@@ -268,44 +1602,1354 @@ def search_rag(query: str, lang: str, supabase: Client) -> List[Dict]:
             scored.append({**chunk, "_score": score})
         
         scored.sort(key=lambda x: x.get("_score", 0), reverse=True)
-        return scored[:6]
+        return scored[:k]
     except Exception as e:
         print(f"[RAG Search] Error: {str(e)}")
         return []
 
 
-def build_context(chunks: List[Dict]) -> str:
-    """RAG 컨텍스트 빌드"""
-    if not chunks:
-        return ""
-    
-    lines = []
-    for c in chunks:
-        doc = c.get("rag_documents", {})
-        title = f" | {doc.get('title', '')}" if doc.get("title") else ""
-        source = f"[{doc.get('source_type', 'source')}{title}]" if doc.get("source_type") else "[source]"
-        content = (c.get("content") or "").strip()
-        lines.append(f"{source} {content}")
-    
-    return "\n\n".join(lines)
-
-
 # ============================================================================
-# 평가 함수
+# 토큰 계산 (컨텍스트 패킹용)
 # ============================================================================
 
-def evaluate_intent_match(inquiry: str, response: str, lang: str) -> bool:
-    """Intent Match 평가"""
+TOKEN_COUNT_CACHE_SIZE = 50000  # 청크 텍스트별 토큰 수 캐시 (검색 결과가 반복되므로)
+
+_token_encoder = None
+_token_encoder_loaded = False
+_token_encoder_lock = threading.Lock()
+_token_count_cache: "OrderedDict[str, int]" = OrderedDict()
+_token_count_cache_lock = threading.Lock()
+
+
+def get_token_encoder():
+    """tiktoken 인코더 (LLM 모델 기준, tiktoken이 없으면 None → 근사치 사용)"""
+    global _token_encoder, _token_encoder_loaded
+    with _token_encoder_lock:
+        if not _token_encoder_loaded:
+            _token_encoder_loaded = True
+            try:
+                import tiktoken
+
+                try:
+                    _token_encoder = tiktoken.encoding_for_model(LLM_MODELS["openai"])
+                except KeyError:
+                    _token_encoder = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                print(f"[Tokens] tiktoken unavailable ({str(e)}), using estimate")
+        return _token_encoder
+
+
+def _estimate_tokens(text: str) -> int:
+    """tiktoken 없을 때 근사치 (ASCII 4글자당 1토큰, 그 외 문자는 1글자당 1토큰)"""
+    non_ascii = sum(1 for ch in text if not ch.isascii())
+    return math.ceil((len(text) - non_ascii) / 4) + non_ascii
+
+
+def count_tokens(text: str) -> int:
+    """텍스트 토큰 수 (캐시)"""
+    if not text:
+        return 0
+    with _token_count_cache_lock:
+        cached = _token_count_cache.get(text)
+        if cached is not None:
+            _token_count_cache.move_to_end(text)
+            return cached
+
+    encoder = get_token_encoder()
+    count = len(encoder.encode(text, disallowed_special=())) if encoder is not None else _estimate_tokens(text)
+
+    with _token_count_cache_lock:
+        _token_count_cache[text] = count
+        while len(_token_count_cache) > TOKEN_COUNT_CACHE_SIZE:
+            _token_count_cache.popitem(last=False)
+    return count
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """텍스트를 max_tokens 토큰 이하로 자름"""
+    if max_tokens <= 0:
+        return ""
+    encoder = get_token_encoder()
+    if encoder is not None:
+        tokens = encoder.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return encoder.decode(tokens[:max_tokens])
+
+    total = _estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+    cut = int(len(text) * max_tokens / total)
+    while cut > 0 and _estimate_tokens(text[:cut]) > max_tokens:
+        cut = int(cut * 0.9)
+    return text[:cut]
+
+
+def _format_context_line(chunk: Dict) -> str:
+    doc = chunk.get("rag_documents", {})
+    title = f" | {doc.get('title', '')}" if doc.get("title") else ""
+    source = f"[{doc.get('source_type', 'source')}{title}]" if doc.get("source_type") else "[source]"
+    content = (chunk.get("content") or "").strip()
+    return f"{source} {content}"
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def build_context(chunks: List[Dict], token_budget: int = RAG_CONTEXT_TOKEN_BUDGET) -> str:
+    """RAG 컨텍스트 빌드 (중복 제거 + 토큰 예산 안에서 순위 순서대로 채움)
+
+    - 같은 청크(id/내용)와 거의 같은 청크(4글자 shingle Jaccard >= RAG_CONTEXT_NEAR_DUP)는 1번만
+    - 예산을 넘는 청크는 건너뛰고 다음 청크 시도 (첫 청크가 예산보다 크면 잘라서 넣음)
+    - token_budget <= 0이면 제한 없음
+    - context_tokens / context_tokens_saved(전부 넣었을 때 대비)를 문의 측정값에 기록
+    """
+    if not chunks:
+        record_inquiry_metric("context_tokens", 0)
+        record_inquiry_metric("context_tokens_saved", 0)
+        return ""
+
+    separator_tokens = count_tokens("\n\n")
+    lines: List[str] = []
+    selected_shingles: List[set] = []
+    seen_ids = set()
+    seen_contents = set()
+    full_tokens = 0
+    used_tokens = 0
+
+    for i, c in enumerate(chunks):
+        line = _format_context_line(c)
+        tokens = count_tokens(line)
+        full_tokens += tokens + (separator_tokens if i else 0)
+
+        chunk_id = c.get("id")
+        content_key = " ".join((c.get("content") or "").lower().split())
+        if (chunk_id is not None and chunk_id in seen_ids) or content_key in seen_contents:
+            continue
+        shingles = shingle_sets(content_key)[1]
+        if any(_jaccard(shingles, other) >= RAG_CONTEXT_NEAR_DUP for other in selected_shingles):
+            continue
+
+        cost = tokens + (separator_tokens if lines else 0)
+        if token_budget > 0 and used_tokens + cost > token_budget:
+            if lines:
+                continue
+            line = truncate_to_tokens(line, token_budget)
+            cost = count_tokens(line)
+            if not line:
+                continue
+
+        lines.append(line)
+        used_tokens += cost
+        selected_shingles.append(shingles)
+        seen_contents.add(content_key)
+        if chunk_id is not None:
+            seen_ids.add(chunk_id)
+
+    record_inquiry_metric("context_tokens", used_tokens)
+    record_inquiry_metric("context_tokens_saved", max(0, full_tokens - used_tokens))
+    return "\n\n".join(lines)
+
+
+# ============================================================================
+# 로컬 RAG 인덱스 (BM25)
+# ============================================================================
+
+RAG_CHUNK_SELECT = (
+    "id, document_id, chunk_index, content, metadata, "
+    "rag_documents(id, source_type, source_id, lang, title, version, updated_at)"
+)
+
+
+class _BM25Partition:
+    """언어 1개 분량의 역색인"""
+
+    def __init__(self):
+        self.chunks: List[Dict[str, Any]] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}  # term -> [(chunk 번호, tf)]
+        self.avg_length = 0.0
+
+    def add(self, chunk: Dict[str, Any], tokens: List[str]):
+        doc_index = len(self.chunks)
+        self.chunks.append(chunk)
+        self.doc_lengths.append(len(tokens))
+        counts: Dict[str, int] = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        for t, tf in counts.items():
+            self.postings.setdefault(t, []).append((doc_index, tf))
+
+
+class BM25Index:
+    """rag_chunks 메모리 역색인 (rag_documents.lang 별로 분할, BM25 점수)
+
+    resolve를 주면 청크 대신 참조(스냅샷 행 번호 등)만 저장하고 검색 결과를 낼 때만 dict로 변환
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, resolve: Optional[Callable[[Any], Dict[str, Any]]] = None):
+        self.k1 = k1
+        self.b = b
+        self.resolve = resolve
+        self.partitions: Dict[str, _BM25Partition] = {}
+
+    def add(self, chunk: Dict[str, Any]):
+        lang = (chunk.get("rag_documents") or {}).get("lang") or ""
+        self.add_ref(chunk, chunk.get("content") or "", lang)
+
+    def add_ref(self, ref: Any, content: str, lang: str):
+        partition = self.partitions.get(lang)
+        if partition is None:
+            partition = self.partitions[lang] = _BM25Partition()
+        partition.add(ref, tokenize(content))
+
+    def finalize(self):
+        """문서 길이 평균 계산 (적재가 끝난 뒤 1번 호출)"""
+        for partition in self.partitions.values():
+            n = len(partition.doc_lengths)
+            partition.avg_length = sum(partition.doc_lengths) / n if n else 0.0
+
+    def __len__(self) -> int:
+        return sum(len(p.chunks) for p in self.partitions.values())
+
+    def _score_partition(self, partition: _BM25Partition, terms: List[str]) -> Dict[int, float]:
+        n = len(partition.chunks)
+        avg_length = partition.avg_length or 1.0
+        scores: Dict[int, float] = {}
+        for term in terms:
+            postings = partition.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for doc_index, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * partition.doc_lengths[doc_index] / avg_length)
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, lang: Optional[str], k: int = RAG_TOP_K) -> List[Dict[str, Any]]:
+        """BM25 top-k (lang이 없으면 모든 언어에서 검색)"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        partitions = [self.partitions.get(lang)] if lang else list(self.partitions.values())
+        candidates: List[Tuple[float, int, _BM25Partition]] = []
+        for partition in partitions:
+            if partition is None:
+                continue
+            for doc_index, score in self._score_partition(partition, terms).items():
+                candidates.append((score, doc_index, partition))
+
+        top = heapq.nlargest(k, candidates, key=lambda x: x[0])
+        resolve = self.resolve or (lambda chunk: chunk)
+        return [{**resolve(partition.chunks[doc_index]), "_score": score} for score, doc_index, partition in top]
+
+
+def iter_table_rows(
+    supabase: Client,
+    table: str,
+    select: str,
+    page_size: int = 1000,
+) -> Iterator[Dict[str, Any]]:
+    """테이블을 id 기준 keyset 페이지로 순회 (OFFSET 없이 일정한 비용)"""
+    last_id = None
+    while True:
+        query = supabase.table(table).select(select).order("id").limit(page_size)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = call_with_rate_limit("supabase", query.execute).data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+def iter_rag_chunks(supabase: Client, page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """rag_chunks + rag_documents 순회"""
+    return iter_table_rows(supabase, "rag_chunks", RAG_CHUNK_SELECT, page_size)
+
+
+def load_rag_index(supabase: Client, page_size: int = 1000) -> BM25Index:
+    """rag_chunks 전체를 한 번 읽어서 BM25 인덱스 구성"""
+    started = time.perf_counter()
+    index = BM25Index()
+    for chunk in iter_rag_chunks(supabase, page_size):
+        index.add(chunk)
+    index.finalize()
+    langs = ", ".join(f"{lang or '?'}={len(p.chunks)}" for lang, p in sorted(index.partitions.items()))
+    print(f"📚 Local RAG index: {len(index)} chunks ({langs}) in {time.perf_counter() - started:.1f}s")
+    return index
+
+
+_rag_index: Optional[BM25Index] = None
+_rag_index_lock = threading.Lock()
+
+
+def get_rag_index(supabase: Client) -> BM25Index:
+    """프로세스당 1번만 적재되는 로컬 RAG 인덱스 (RAG_SNAPSHOT_PATH가 있으면 스냅샷에서)"""
+    global _rag_index
+    with _rag_index_lock:
+        if _rag_index is None:
+            if RAG_SNAPSHOT_PATH:
+                _rag_index = load_rag_index_from_snapshot(get_rag_snapshot())
+            else:
+                _rag_index = load_rag_index(supabase)
+        return _rag_index
+
+
+# ============================================================================
+# 코퍼스 스냅샷 (Arrow IPC, memory-map)
+# ============================================================================
+
+# rag_chunks + rag_documents를 청크 1행으로 펼친 컬럼
+RAG_SNAPSHOT_COLUMNS = [
+    "id", "document_id", "chunk_index", "content", "metadata",
+    "source_type", "source_id", "lang", "title", "version", "updated_at",
+]
+
+
+def _snapshot_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.string()),
+        ("document_id", pa.string()),
+        ("chunk_index", pa.int32()),
+        ("content", pa.string()),
+        ("metadata", pa.string()),  # JSON 문자열
+        ("source_type", pa.string()),
+        ("source_id", pa.string()),
+        ("lang", pa.string()),
+        ("title", pa.string()),
+        ("version", pa.int32()),
+        ("updated_at", pa.string()),
+    ])
+
+
+def _snapshot_manifest_path(path: str) -> str:
+    return path + ".json"
+
+
+def export_rag_snapshot(supabase: Client, path: str = "rag_snapshot.arrow", page_size: int = 1000) -> Dict[str, Any]:
+    """rag_chunks + rag_documents를 keyset 페이지 단위로 Arrow IPC 파일에 기록
+
+    - 페이지마다 record batch 1개 (전체를 메모리에 올리지 않음)
+    - corpus_version: 기록한 행 (id, 문서 version/updated_at, 내용)의 누적 SHA-256
+    - 메타데이터는 <path>.json (임시 파일에 쓴 뒤 rename)
+    """
+    import pyarrow as pa
+
+    started = time.perf_counter()
+    schema = _snapshot_schema()
+    digest = hashlib.sha256()
+    rows_written = 0
+    documents: set = set()
+    langs: Dict[str, int] = {}
+
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        page: List[Dict[str, Any]] = []
+
+        def write_page():
+            writer.write_batch(pa.RecordBatch.from_pylist(page, schema=schema))
+            page.clear()
+
+        for chunk in iter_rag_chunks(supabase, page_size):
+            doc = chunk.get("rag_documents") or {}
+            row = {
+                "id": chunk["id"],
+                "document_id": chunk.get("document_id"),
+                "chunk_index": chunk.get("chunk_index"),
+                "content": chunk.get("content") or "",
+                "metadata": json.dumps(chunk.get("metadata") or {}, ensure_ascii=False),
+                "source_type": doc.get("source_type"),
+                "source_id": doc.get("source_id"),
+                "lang": doc.get("lang"),
+                "title": doc.get("title"),
+                "version": doc.get("version"),
+                "updated_at": doc.get("updated_at"),
+            }
+            digest.update(json.dumps(
+                [row["id"], row["document_id"], row["version"], row["updated_at"], row["content"]],
+                ensure_ascii=False,
+            ).encode("utf-8"))
+            digest.update(b"\n")
+            page.append(row)
+            rows_written += 1
+            documents.add(row["document_id"])
+            langs[row["lang"] or ""] = langs.get(row["lang"] or "", 0) + 1
+            if len(page) >= page_size:
+                write_page()
+        if page:
+            write_page()
+
+    manifest = {
+        "corpus_version": digest.hexdigest()[:16],
+        "chunks": rows_written,
+        "documents": len(documents),
+        "langs": langs,
+        "created_at": datetime.now().isoformat(),
+    }
+    os.replace(tmp_path, path)
+    with open(_snapshot_manifest_path(path) + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(_snapshot_manifest_path(path) + ".tmp", _snapshot_manifest_path(path))
+
+    print(
+        f"📦 RAG snapshot: {rows_written} chunks / {len(documents)} documents -> {path} "
+        f"(corpus_version={manifest['corpus_version']}, "
+        f"{os.path.getsize(path)/1024/1024:.1f}MB in {time.perf_counter() - started:.1f}s)"
+    )
+    return manifest
+
+
+class RagSnapshot:
+    """Arrow 스냅샷 읽기 전용 뷰 (memory-map이라 파일 내용을 Python 객체로 복사하지 않음)"""
+
+    def __init__(self, path: str):
+        import pyarrow as pa
+
+        self.path = path
+        self._source = pa.memory_map(path, "r")
+        self.table = pa.ipc.open_file(self._source).read_all()
+        try:
+            with open(_snapshot_manifest_path(path), encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+        self.corpus_version = self.manifest.get("corpus_version", "unknown")
+        self._columns = {name: self.table.column(name) for name in RAG_SNAPSHOT_COLUMNS}
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def iter_content(self, batch_size: int = 10000) -> Iterator[Tuple[int, str, str]]:
+        """(행 번호, 내용, lang)을 배치 단위로 순회 (인덱스 구성용)"""
+        row = 0
+        for batch in self.table.select(["content", "lang"]).to_batches(max_chunksize=batch_size):
+            contents = batch.column(0).to_pylist()
+            langs = batch.column(1).to_pylist()
+            for content, lang in zip(contents, langs):
+                yield row, content or "", lang or ""
+                row += 1
+
+    def chunk(self, row: int) -> Dict[str, Any]:
+        """행 1개를 rag_chunks + rag_documents(...) 조인 결과와 같은 모양으로 변환"""
+        v = {name: column[row].as_py() for name, column in self._columns.items()}
+        return {
+            "id": v["id"],
+            "document_id": v["document_id"],
+            "chunk_index": v["chunk_index"],
+            "content": v["content"],
+            "metadata": json.loads(v["metadata"] or "{}"),
+            "rag_documents": {
+                "id": v["document_id"],
+                "source_type": v["source_type"],
+                "source_id": v["source_id"],
+                "lang": v["lang"],
+                "title": v["title"],
+                "version": v["version"],
+                "updated_at": v["updated_at"],
+            },
+        }
+
+
+_rag_snapshot: Optional[RagSnapshot] = None
+_rag_snapshot_lock = threading.Lock()
+
+
+def get_rag_snapshot(path: Optional[str] = None) -> RagSnapshot:
+    """프로세스당 1번만 여는 코퍼스 스냅샷 (기본: RAG_SNAPSHOT_PATH)"""
+    global _rag_snapshot
+    path = path or RAG_SNAPSHOT_PATH
+    with _rag_snapshot_lock:
+        if _rag_snapshot is None or _rag_snapshot.path != path:
+            _rag_snapshot = RagSnapshot(path)
+        return _rag_snapshot
+
+
+def load_rag_index_from_snapshot(snapshot: RagSnapshot) -> BM25Index:
+    """스냅샷으로 BM25 인덱스 구성 (청크는 행 번호만 저장, 결과를 낼 때만 변환)"""
+    started = time.perf_counter()
+    index = BM25Index(resolve=snapshot.chunk)
+    for row, content, lang in snapshot.iter_content():
+        index.add_ref(row, content, lang)
+    index.finalize()
+    langs = ", ".join(f"{lang or '?'}={len(p.chunks)}" for lang, p in sorted(index.partitions.items()))
+    print(
+        f"📚 Local RAG index (snapshot {snapshot.corpus_version}): {len(index)} chunks ({langs}) "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    return index
+
+
+def current_corpus_version(backend: str = RAG_BACKEND) -> str:
+    """결과 CSV에 기록할 코퍼스 버전 (스냅샷 검색이면 스냅샷 버전, 아니면 live)"""
+    if RAG_SNAPSHOT_PATH and backend == "local":
+        return get_rag_snapshot().corpus_version
+    return "live"
+
+
+# ============================================================================
+# 임베딩 / 벡터 검색 (pgvector)
+# ============================================================================
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """OpenAI 임베딩 (배치 1회 호출, LLM_PROVIDER와 상관없이 OPENAI_API_KEY 필요)"""
+    if not texts:
+        return []
+    client = get_llm_client("openai")
+    response = call_with_rate_limit(
+        "openai",
+        client.embeddings.create,
+        model=EMBEDDING_MODEL,
+        input=texts,
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+def _vector_literal(vector: Iterable[float]) -> str:
+    """pgvector 텍스트 표현 ('[0.1,0.2,...]'), PostgREST로 그대로 전달 가능"""
+    return "[" + ",".join(f"{float(v):.7g}" for v in vector) + "]"
+
+
+def _parse_vector(value: Any) -> List[float]:
+    """PostgREST가 돌려준 vector 컬럼 ('[...]' 문자열 또는 배열) 파싱"""
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value or [])
+
+
+def embedding_content_hash(content: str, model: str = EMBEDDING_MODEL) -> str:
+    """임베딩 저장소 키: sha256(모델 + 공백 정규화한 청크 내용)"""
+    normalized = " ".join((content or "").split())
+    return hashlib.sha256(f"{model}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+def _lookup_stored_embeddings(supabase: Client, hashes: List[str], page_size: int = 100) -> Dict[str, str]:
+    """rag_embedding_store에서 content_hash -> 벡터('[...]' 그대로) 조회"""
+    found: Dict[str, str] = {}
+    for i in range(0, len(hashes), page_size):
+        result = call_with_rate_limit("supabase", supabase.table("rag_embedding_store").select(
+            "content_hash, embedding"
+        ).in_("content_hash", hashes[i:i + page_size]).execute)
+        for row in result.data or []:
+            found[row["content_hash"]] = row["embedding"]
+    return found
+
+
+def _embed_chunk_batch(supabase: Client, batch: List[Tuple[Dict[str, Any], str]], force: bool = False) -> Dict[str, int]:
+    """청크 배치 1개 처리: 저장소에 있는 벡터는 재사용, 없는 내용만 임베딩 API 호출"""
+    hashes = list(dict.fromkeys(h for _, h in batch))
+    vectors = {} if force else _lookup_stored_embeddings(supabase, hashes)
+    reused = sum(1 for _, h in batch if h in vectors)
+
+    # 같은 내용은 배치 안에서도 1번만 계산
+    missing = [h for h in hashes if h not in vectors]
+    if missing:
+        contents = {h: c.get("content") or "" for c, h in batch}
+        computed = embed_texts([contents[h] for h in missing])
+        new_rows = [
+            {"content_hash": h, "model": EMBEDDING_MODEL, "embedding": _vector_literal(v)}
+            for h, v in zip(missing, computed)
+        ]
+        call_with_rate_limit(
+            "supabase",
+            supabase.table("rag_embedding_store").upsert(new_rows, on_conflict="content_hash").execute,
+        )
+        vectors.update((r["content_hash"], r["embedding"]) for r in new_rows)
+
+    rows = [
+        {
+            "chunk_id": c["id"],
+            "document_id": c.get("document_id"),
+            "model": EMBEDDING_MODEL,
+            "content_hash": h,
+            "embedding": vectors[h],
+        }
+        for c, h in batch
+    ]
+    call_with_rate_limit(
+        "supabase",
+        supabase.table("rag_embeddings").upsert(rows, on_conflict="chunk_id").execute,
+    )
+    return {"reused": reused, "computed": len(batch) - reused}
+
+
+def embed_rag_chunks(
+    supabase: Client,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    concurrency: int = EMBEDDING_CONCURRENCY,
+    force: bool = False,
+    page_size: int = 1000,
+) -> Dict[str, int]:
+    """rag_chunks 임베딩 적재 작업 (변경분만 계산)
+
+    - unchanged: rag_embeddings의 content_hash가 현재 내용과 같은 청크 (건너뜀)
+    - reused: 새 청크/바뀐 청크지만 같은 내용의 벡터가 rag_embedding_store에 있음 (API 호출 없음)
+    - computed: 임베딩 API로 새로 계산
+    - force=True면 저장소를 무시하고 전부 다시 계산
+    - batch_size개씩 묶어 처리, 최대 concurrency개 배치를 동시에 진행
+    """
+    started = time.perf_counter()
+    existing: Dict[str, Optional[str]] = {}
+    if not force:
+        for row in iter_table_rows(supabase, "rag_embeddings", "id, chunk_id, model, content_hash", page_size):
+            if row.get("model") == EMBEDDING_MODEL:
+                existing[row["chunk_id"]] = row.get("content_hash")
+
+    counts = {"unchanged": 0, "reused": 0, "computed": 0, "failed": 0}
+
+    def iter_batches() -> Iterator[List[Tuple[Dict[str, Any], str]]]:
+        batch: List[Tuple[Dict[str, Any], str]] = []
+        for chunk in iter_table_rows(supabase, "rag_chunks", "id, document_id, content", page_size):
+            content_hash = embedding_content_hash(chunk.get("content") or "")
+            if existing.get(chunk["id"]) == content_hash:
+                counts["unchanged"] += 1
+                continue
+            batch.append((chunk, content_hash))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    concurrency = max(1, concurrency)
+    get_rate_limiter("openai", concurrency)
+
+    for batch, result, error in iter_bounded(lambda b: _embed_chunk_batch(supabase, b, force), iter_batches(), concurrency):
+        if error is not None:
+            counts["failed"] += len(batch)
+            print(f"[Embedding] Batch Error: {str(error)}")
+            continue
+        for key, value in result.items():
+            counts[key] += value
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"🧮 Embeddings ({EMBEDDING_MODEL}): reused={counts['unchanged'] + counts['reused']} "
+        f"(unchanged={counts['unchanged']}, store={counts['reused']}), "
+        f"computed={counts['computed']}, failed={counts['failed']} in {elapsed:.1f}s"
+    )
+    return counts
+
+
+class InMemoryVectorIndex:
+    """pgvector 대체용 메모리 벡터 인덱스 (오프라인 테스트용, NumPy 필요)
+
+    rag_documents.lang 별로 정규화된 행렬을 두고 cosine 유사도로 top-k 검색
+    """
+
+    def __init__(self, embedder: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise ImportError("InMemoryVectorIndex requires numpy (pip install numpy)") from e
+        self._np = np
+        self.embedder = embedder or embed_texts
+        self._pending: Dict[str, List[Tuple[Dict[str, Any], List[float]]]] = {}
+        self.partitions: Dict[str, Tuple[List[Dict[str, Any]], Any]] = {}
+
+    def add(self, chunk: Dict[str, Any], vector: List[float]):
+        lang = (chunk.get("rag_documents") or {}).get("lang") or ""
+        self._pending.setdefault(lang, []).append((chunk, vector))
+
+    def add_chunks(self, chunks: Iterable[Dict[str, Any]], batch_size: int = EMBEDDING_BATCH_SIZE):
+        """청크를 embedder로 임베딩해서 추가"""
+        batch: List[Dict[str, Any]] = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                self._add_batch(batch)
+                batch = []
+        if batch:
+            self._add_batch(batch)
+
+    def _add_batch(self, batch: List[Dict[str, Any]]):
+        for chunk, vector in zip(batch, self.embedder([c.get("content") or "" for c in batch])):
+            self.add(chunk, vector)
+
+    def finalize(self):
+        """언어별 행렬 구성 (행 단위 L2 정규화, 적재가 끝난 뒤 1번 호출)"""
+        np = self._np
+        for lang, items in self._pending.items():
+            chunks, matrix = self.partitions.get(lang, ([], None))
+            added = np.asarray([v for _, v in items], dtype=np.float32)
+            norms = np.linalg.norm(added, axis=1, keepdims=True)
+            added /= np.where(norms == 0, 1.0, norms)
+            matrix = added if matrix is None else np.vstack([matrix, added])
+            self.partitions[lang] = (chunks + [c for c, _ in items], matrix)
+        self._pending = {}
+
+    def __len__(self) -> int:
+        return sum(len(chunks) for chunks, _ in self.partitions.values())
+
+    def search_vector(self, vector: List[float], lang: Optional[str], k: int = RAG_TOP_K) -> List[Dict[str, Any]]:
+        """임베딩 벡터로 top-k 검색 (lang이 없으면 모든 언어에서 검색)"""
+        np = self._np
+        if self._pending:
+            self.finalize()
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query /= norm
+
+        partitions = [self.partitions.get(lang)] if lang else list(self.partitions.values())
+        candidates: List[Tuple[float, Dict[str, Any]]] = []
+        for partition in partitions:
+            if partition is None:
+                continue
+            chunks, matrix = partition
+            scores = matrix @ query
+            top = np.argpartition(-scores, k - 1)[:k] if len(chunks) > k else np.arange(len(chunks))
+            candidates.extend((float(scores[i]), chunks[i]) for i in top)
+
+        candidates.sort(key=lambda x: x[0], reverse=True)
+        return [{**chunk, "_score": score} for score, chunk in candidates[:k]]
+
+    def search(self, query: str, lang: Optional[str], k: int = RAG_TOP_K) -> List[Dict[str, Any]]:
+        return self.search_vector(self.embedder([query])[0], lang, k)
+
+
+def load_vector_index(supabase: Client, page_size: int = 1000) -> InMemoryVectorIndex:
+    """rag_embeddings(+ rag_chunks)를 읽어서 메모리 벡터 인덱스 구성 (임베딩 재계산 없음)"""
+    started = time.perf_counter()
+    index = InMemoryVectorIndex()
+    select = f"id, embedding, model, rag_chunks({RAG_CHUNK_SELECT})"
+    for row in iter_table_rows(supabase, "rag_embeddings", select, page_size):
+        if row.get("model") == EMBEDDING_MODEL and row.get("rag_chunks"):
+            index.add(row["rag_chunks"], _parse_vector(row["embedding"]))
+    index.finalize()
+    print(f"🧭 Vector index: {len(index)} chunks in {time.perf_counter() - started:.1f}s")
+    return index
+
+
+_vector_index: Optional[InMemoryVectorIndex] = None
+
+
+def set_vector_index(index: Optional[InMemoryVectorIndex]):
+    """backend="vector" 검색을 pgvector 대신 메모리 인덱스로 처리 (None이면 다시 pgvector)"""
+    global _vector_index
+    _vector_index = index
+
+
+def _search_rag_vector(
+    query: str,
+    lang: str,
+    supabase: Client,
+    k: int = RAG_TOP_K,
+    fallback: bool = True,
+) -> List[Dict]:
+    """벡터 검색 (match_rag_chunks RPC가 없으면 fallback=True일 때 키워드 검색으로 대체)"""
+    try:
+        if _vector_index is not None:
+            return _vector_index.search(query, lang, k)
+        if RAG_VECTOR_RPC in _missing_rpcs:
+            return _search_rag_backend(query, lang, supabase, k, backend="rpc") if fallback else []
+
+        query_embedding = embed_texts([query])[0]
+        result = call_with_rate_limit("supabase", supabase.rpc(RAG_VECTOR_RPC, {
+            "query_embedding": _vector_literal(query_embedding),
+            "query_lang": lang or None,
+            "match_count": k,
+        }).execute)
+        return [_rpc_row_to_chunk(row) for row in (result.data or [])]
+    except Exception as e:
+        if _is_missing_rpc_error(e):
+            _missing_rpcs.add(RAG_VECTOR_RPC)
+            print(f"[RAG Search] {RAG_VECTOR_RPC}() not found, using keyword search "
+                  "(apply migrations/20261018_add_rag_embeddings.sql)")
+            return _search_rag_backend(query, lang, supabase, k, backend="rpc") if fallback else []
+        print(f"[RAG Search] Vector Error: {str(e)}")
+        return []
+
+
+# ============================================================================
+# Hybrid 검색 (키워드 + 벡터, Reciprocal Rank Fusion)
+# ============================================================================
+
+def fuse_rankings(
+    rankings: Dict[str, List[Dict[str, Any]]],
+    k: int = RAG_TOP_K,
+    method: str = RAG_HYBRID_FUSION,
+    weights: Optional[Dict[str, float]] = None,
+    rrf_k: int = RAG_RRF_K,
+) -> List[Dict[str, Any]]:
+    """검색 결과 여러 개를 청크 id 기준으로 융합
+
+    - rrf: score = Σ weight / (rrf_k + rank)  (점수 스케일이 다른 검색끼리도 안전)
+    - weighted: 검색별 _score를 min-max 정규화 후 가중합
+    - 결과 청크에 _scores (검색별 원점수), _ranks (검색별 순위, 1부터) 추가
+    """
+    weights = weights or RAG_HYBRID_WEIGHTS
+    fused: Dict[str, Dict[str, Any]] = {}
+
+    for source, chunks in rankings.items():
+        weight = weights.get(source, 1.0)
+        raw = [float(c.get("_score") or 0) for c in chunks]
+        low, high = (min(raw), max(raw)) if raw else (0.0, 0.0)
+
+        for rank, (chunk, score) in enumerate(zip(chunks, raw), start=1):
+            if method == "weighted":
+                contribution = weight * ((score - low) / (high - low) if high > low else 1.0)
+            else:
+                contribution = weight / (rrf_k + rank)
+
+            entry = fused.get(chunk["id"])
+            if entry is None:
+                entry = fused[chunk["id"]] = {**chunk, "_score": 0.0, "_scores": {}, "_ranks": {}}
+            entry["_score"] += contribution
+            entry["_scores"][source] = score
+            entry["_ranks"][source] = rank
+
+    return heapq.nlargest(k, fused.values(), key=lambda c: c["_score"])
+
+
+_hybrid_executor: Optional[ThreadPoolExecutor] = None
+_hybrid_executor_lock = threading.Lock()
+
+
+def _get_hybrid_executor() -> ThreadPoolExecutor:
+    """벡터 검색을 돌릴 공유 스레드 풀 (호출마다 풀을 만들지 않도록)"""
+    global _hybrid_executor
+    with _hybrid_executor_lock:
+        if _hybrid_executor is None:
+            _hybrid_executor = ThreadPoolExecutor(
+                max_workers=max(1, EVAL_CONCURRENCY),
+                thread_name_prefix="rag-hybrid",
+            )
+        return _hybrid_executor
+
+
+def _search_rag_hybrid(query: str, lang: str, supabase: Client, k: int = RAG_TOP_K) -> List[Dict]:
+    """키워드/벡터 검색을 동시에 실행 (지연 시간 ≈ 둘 중 느린 쪽)"""
+    candidates = k * RAG_HYBRID_CANDIDATES
+    vector_future = _get_hybrid_executor().submit(
+        _search_rag_vector, query, lang, supabase, candidates, False
+    )
+    keyword = _search_rag_backend(query, lang, supabase, candidates, backend=RAG_HYBRID_KEYWORD_BACKEND)
+    try:
+        vector = vector_future.result()
+    except Exception as e:
+        print(f"[RAG Search] Hybrid Vector Error: {str(e)}")
+        vector = []
+    return fuse_rankings({"keyword": keyword, "vector": vector}, k)
+
+
+# ============================================================================
+# 검색 결과 캐시 (문서 버전 기반 무효화)
+# ============================================================================
+
+class RetrievalCache:
+    """검색 결과 메모리 캐시
+
+    - 키: (공백/대소문자 정규화한 질문, lang, k, backend)
+    - 항목마다 결과에 포함된 문서의 (version, updated_at)을 기록
+    - revalidate(): rag_corpus_signature RPC 1번으로 코퍼스 시그니처 확인
+      - 문서/청크 수 또는 id 체크섬이 바뀌었으면(추가·삭제) 어떤 결과가 영향을 받는지 알 수 없으므로 전부 제거
+      - 최근 변경 문서가 watermark 이후면 rag_documents에서 (updated_at, id) keyset으로 바뀐 문서만 조회
+        - 결과에 포함된 문서가 바뀌었으면 그 문서를 참조하는 항목 제거
+        - 결과에 없던 문서(새 문서 포함)가 바뀌었으면 순위가 달라질 수 있으므로 같은 언어 항목 제거
+      - RPC가 없으면 REST count(행 수만)로 대체 — 같은 수만큼 삭제 + 추가된 경우는 감지하지 못함
+    - revalidate_seconds=0(기본)이면 매 조회 전에 확인, N>0이면 최대 N초 동안 오래된 결과를 반환할 수 있음
+    - 검색 중에 무효화가 일어나면 그 검색 결과는 저장하지 않음 (generation 비교)
+    - 빈 결과는 저장하지 않음 (일시적인 오류 결과가 남지 않도록)
+    """
+
+    def __init__(self, max_entries: int = RAG_CACHE_SIZE, revalidate_seconds: float = RAG_CACHE_REVALIDATE_SECONDS):
+        self.max_entries = max_entries
+        self.revalidate_seconds = revalidate_seconds
+        self._lock = threading.Lock()
+        self._revalidate_lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[List[Dict[str, Any]], str, Dict[str, Tuple]]]" = OrderedDict()
+        self._doc_keys: Dict[str, set] = {}  # document id -> 캐시 키
+        self._lang_keys: Dict[str, set] = {}  # lang ("" = 언어 필터 없음) -> 캐시 키
+        self._watermark: Optional[Tuple[str, str]] = None  # (updated_at, id) keyset 커서
+        self._membership: Optional[Tuple] = None  # (문서 수, 청크 수, id 체크섬)
+        self._generation = 0  # 무효화할 때마다 증가
+        self._last_revalidate = 0.0
+        self._last_revalidate_started = float("-inf")
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(query: str, lang: Optional[str], k: int, backend: str) -> Tuple:
+        normalized = " ".join(unicodedata.normalize("NFKC", query or "").lower().split())
+        return (normalized, lang or "", k, backend)
+
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[0])
+
+    def generation(self) -> int:
+        """검색 전에 읽어 두고 put에 넘기면, 그 사이에 무효화가 있었을 때 저장하지 않음"""
+        return self._generation
+
+    def put(self, key: Tuple, lang: Optional[str], chunks: List[Dict[str, Any]], generation: Optional[int] = None):
+        if not chunks or self.max_entries <= 0:
+            return
+        versions: Dict[str, Tuple] = {}
+        for c in chunks:
+            doc = c.get("rag_documents") or {}
+            doc_id = doc.get("id") or c.get("document_id")
+            if doc_id:
+                versions[doc_id] = (doc.get("version"), doc.get("updated_at"))
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._remove(key)
+            self._entries[key] = (list(chunks), lang or "", versions)
+            for doc_id in versions:
+                self._doc_keys.setdefault(doc_id, set()).add(key)
+            self._lang_keys.setdefault(lang or "", set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Tuple) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        _, lang, versions = entry
+        for doc_id in versions:
+            keys = self._doc_keys.get(doc_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._doc_keys[doc_id]
+        self._lang_keys.get(lang, set()).discard(key)
+        return True
+
+    def invalidate_documents(self, documents: List[Dict[str, Any]]) -> int:
+        """바뀐 rag_documents 행 (id, lang, version, updated_at) 반영, 제거한 항목 수 반환"""
+        removed = 0
+        with self._lock:
+            if documents:
+                self._generation += 1
+            for doc in documents:
+                doc_id = doc.get("id")
+                current = (doc.get("version"), doc.get("updated_at"))
+                keys = self._doc_keys.get(doc_id)
+                if keys:
+                    stale = [key for key in keys if self._entries[key][2].get(doc_id) != current]
+                else:
+                    # 결과에 없던 문서: 같은 언어 + 언어 필터 없는 항목이 영향을 받을 수 있음
+                    stale = list(self._lang_keys.get(doc.get("lang") or "", ())) + list(self._lang_keys.get("", ()))
+                for key in stale:
+                    removed += self._remove(key)
+            self.invalidations += removed
+        return removed
+
+    def maybe_revalidate(self, supabase: Client):
+        """조회 전 코퍼스 변경 확인
+
+        - revalidate_seconds=0: 매번 확인. 다른 스레드가 이 호출 이후에 시작한 확인이 끝났으면 그 결과를 공유,
+          확인에 실패하면 오래된 결과를 내지 않도록 캐시를 비움
+        - revalidate_seconds>0: N초마다 1번만 확인 (다른 스레드가 확인 중이면 건너뜀)
+        """
+        requested = time.monotonic()
+        if self.revalidate_seconds > 0:
+            if requested - self._last_revalidate < self.revalidate_seconds:
+                return
+            if not self._revalidate_lock.acquire(blocking=False):
+                return
+            try:
+                self.revalidate(supabase)
+            except Exception as e:
+                print(f"[RAG Cache] Revalidate Error: {str(e)}")
+            finally:
+                self._last_revalidate = time.monotonic()
+                self._revalidate_lock.release()
+            return
+
+        with self._revalidate_lock:
+            if self._last_revalidate_started >= requested:
+                return
+            self._last_revalidate_started = time.monotonic()
+            try:
+                self.revalidate(supabase)
+            except Exception as e:
+                print(f"[RAG Cache] Revalidate Error (cache cleared): {str(e)}")
+                self.clear()
+            finally:
+                self._last_revalidate = time.monotonic()
+
+    def _corpus_signature(self, supabase: Client) -> Tuple[Tuple, Optional[Tuple[str, str]]]:
+        """((문서 수, 청크 수, id 체크섬), 최근 변경 문서 (updated_at, id)) — RPC가 없으면 (행 수, None)"""
+        if RAG_CORPUS_SIGNATURE_RPC not in _missing_rpcs:
+            try:
+                result = call_with_rate_limit("supabase", supabase.rpc(RAG_CORPUS_SIGNATURE_RPC, {}).execute)
+                row = (result.data or [{}])[0]
+                latest = (
+                    (row["max_updated_at"], row["max_id"]) if row.get("max_updated_at")
+                    else ("1970-01-01T00:00:00+00:00", "00000000-0000-0000-0000-000000000000")
+                )
+                return (row.get("document_count"), row.get("chunk_count"), row.get("id_checksum")), latest
+            except Exception as e:
+                if not _is_missing_rpc_error(e):
+                    raise
+                _missing_rpcs.add(RAG_CORPUS_SIGNATURE_RPC)
+                print(f"[RAG Cache] {RAG_CORPUS_SIGNATURE_RPC}() not found, comparing row counts instead "
+                      "(apply migrations/20261018_add_rag_corpus_signature_rpc.sql)")
+
+        counts = []
+        for table in ("rag_documents", "rag_chunks"):
+            result = call_with_rate_limit("supabase", supabase.table(table).select("id", count="exact").limit(1).execute)
+            counts.append(result.count)
+        return tuple(counts), None
+
+    def _latest_document(self, supabase: Client) -> Tuple[str, str]:
+        result = call_with_rate_limit("supabase", supabase.table("rag_documents").select(
+            "id, updated_at"
+        ).not_.is_("updated_at", "null").order("updated_at", desc=True).order(
+            "id", desc=True
+        ).limit(1).execute)
+        rows = result.data or []
+        return (
+            (rows[0]["updated_at"], rows[0]["id"]) if rows
+            else ("1970-01-01T00:00:00+00:00", "00000000-0000-0000-0000-000000000000")
+        )
+
+    def revalidate(self, supabase: Client, page_size: int = 1000):
+        membership, latest = self._corpus_signature(supabase)
+        if self._membership is not None and membership != self._membership:
+            # 문서/청크가 추가·삭제됨: 삭제된 청크가 어느 결과에 있는지 알 수 없으므로 전부 버림
+            self.clear()
+        self._membership = membership
+
+        if self._watermark is None:
+            # 첫 확인: 현재 시점을 기준점으로만 잡음 (아직 캐시된 항목 없음)
+            self._watermark = latest or self._latest_document(supabase)
+            return
+        if latest is not None and tuple(latest) == self._watermark:
+            return
+
+        while True:
+            # (updated_at, id) keyset: 같은 시각에 바뀐 문서가 page_size보다 많아도 다음 페이지로 진행
+            at, last_id = self._watermark
+            result = call_with_rate_limit("supabase", supabase.table("rag_documents").select(
+                "id, lang, version, updated_at"
+            ).or_(
+                f'updated_at.gt."{at}",and(updated_at.eq."{at}",id.gt.{last_id})'
+            ).order("updated_at").order("id").limit(page_size).execute)
+            rows = result.data or []
+            if rows:
+                self.invalidate_documents(rows)
+                self._watermark = (rows[-1]["updated_at"], rows[-1]["id"])
+            if len(rows) < page_size:
+                return
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._doc_keys.clear()
+            self._lang_keys.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_retrieval_cache: Optional[RetrievalCache] = None
+_retrieval_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> Optional[RetrievalCache]:
+    """검색 결과 캐시 (RAG_CACHE_SIZE가 0이면 None)"""
+    global _retrieval_cache
+    if RAG_CACHE_SIZE <= 0:
+        return None
+    with _retrieval_cache_lock:
+        if _retrieval_cache is None:
+            _retrieval_cache = RetrievalCache()
+        return _retrieval_cache
+
+
+def print_retrieval_cache_stats():
+    """검색 결과 캐시 통계 출력"""
+    if _retrieval_cache is None:
+        return
+    st = _retrieval_cache.stats()
+    print(
+        f"\n🗂️ Retrieval cache: hits={st['hits']}, misses={st['misses']} "
+        f"({st['hit_rate']*100:.1f}% hit), entries={st['entries']}, "
+        f"invalidations={st['invalidations']}, evictions={st['evictions']}"
+    )
+
+
+# ============================================================================
+# 대량 적재 (COPY / REST 배치 upsert)
+# ============================================================================
+
+def _dedupe_batch(rows: List[Dict[str, Any]], conflict_keys: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """같은 충돌 키가 배치 안에 두 번 있으면 ON CONFLICT가 실패하므로 마지막 행만 유지"""
+    if not conflict_keys:
+        return rows
+    latest: Dict[Tuple, Dict[str, Any]] = {}
+    for row in rows:
+        latest[tuple(row.get(k) for k in conflict_keys)] = row
+    return list(latest.values())
+
+
+def _pg_array_literal(values: Iterable[Any]) -> str:
+    """text[] 등 배열 컬럼용 Postgres 배열 리터럴 ({"a","b"}; 요소는 항상 따옴표 + 이스케이프)"""
+    items = []
+    for v in values:
+        if v is None:
+            items.append("NULL")
+        elif isinstance(v, (list, tuple)):
+            items.append(_pg_array_literal(v))
+        else:
+            text = _csv_value(v)
+            items.append('"' + str(text).replace("\\", "\\\\").replace('"', '\\"') + '"')
+    return "{" + ",".join(items) + "}"
+
+
+def _csv_value(value: Any, array: bool = False) -> Any:
+    if value is None:
+        return None
+    if array and isinstance(value, (list, tuple)):
+        return _pg_array_literal(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+class _CopyWriter:
+    """psycopg2 COPY 기록기 (스레드마다 연결 1개)"""
+
+    def __init__(self, dsn: str, table: str, columns: List[str], conflict_keys: Optional[List[str]], update: bool):
+        try:
+            import psycopg2
+            from psycopg2 import sql
+        except ImportError as e:
+            raise ImportError("COPY bulk load requires psycopg2 (pip install psycopg2-binary)") from e
+        self._psycopg2 = psycopg2
+        self._sql = sql
+        self.dsn = dsn
+        self.table = table
+        self.columns = columns
+        self.conflict_keys = conflict_keys
+        self.update = update
+        self._local = threading.local()
+        self._connections: List[Any] = []
+        self._lock = threading.Lock()
+        self._array_columns: Optional[set] = None
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn.closed:
+            conn = self._psycopg2.connect(self.dsn)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _load_array_columns(self, conn) -> set:
+        """대상 테이블의 배열 컬럼 (list 값을 jsonb는 JSON, 배열 타입은 배열 리터럴로 기록)"""
+        if self._array_columns is None:
+            schema, _, name = self.table.rpartition(".")
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT column_name FROM information_schema.columns "
+                    "WHERE table_schema = %s AND table_name = %s AND data_type = 'ARRAY'",
+                    (schema or "public", name),
+                )
+                self._array_columns = {r[0] for r in cur.fetchall()}
+            conn.commit()
+        return self._array_columns
+
+    def write(self, rows: List[Dict[str, Any]]) -> int:
+        import io
+
+        sql = self._sql
+        conn = self._connection()
+        array_columns = self._load_array_columns(conn)
+        buffer = io.StringIO()
+        csv_writer = csv.writer(buffer)
+        for row in rows:
+            csv_writer.writerow([
+                "\\N" if row.get(c) is None else _csv_value(row.get(c), c in array_columns)
+                for c in self.columns
+            ])
+        buffer.seek(0)
+
+        schema, _, name = self.table.rpartition(".")
+        target = sql.Identifier(schema or "public", name)
+        columns = sql.SQL(", ").join(sql.Identifier(c) for c in self.columns)
+        copy_options = sql.SQL("WITH (FORMAT csv, NULL '\\N')")
+
+        try:
+            with conn.cursor() as cur:
+                if not self.conflict_keys:
+                    cur.copy_expert(
+                        sql.SQL("COPY {} ({}) FROM STDIN {}").format(target, columns, copy_options).as_string(conn),
+                        buffer,
+                    )
+                else:
+                    # COPY는 ON CONFLICT를 지원하지 않으므로 임시 테이블에 COPY 후 INSERT ... ON CONFLICT
+                    staging = sql.Identifier(f"_bulk_{name}_{threading.get_ident()}")
+                    cur.execute(sql.SQL(
+                        "CREATE TEMP TABLE IF NOT EXISTS {} (LIKE {} INCLUDING DEFAULTS)"
+                    ).format(staging, target))
+                    cur.execute(sql.SQL("TRUNCATE {}").format(staging))
+                    cur.copy_expert(
+                        sql.SQL("COPY {} ({}) FROM STDIN {}").format(staging, columns, copy_options).as_string(conn),
+                        buffer,
+                    )
+                    keys = sql.SQL(", ").join(sql.Identifier(k) for k in self.conflict_keys)
+                    updates = [c for c in self.columns if c not in self.conflict_keys]
+                    if self.update and updates:
+                        action = sql.SQL("DO UPDATE SET {}").format(sql.SQL(", ").join(
+                            sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(c), sql.Identifier(c))
+                            for c in updates
+                        ))
+                    else:
+                        action = sql.SQL("DO NOTHING")
+                    cur.execute(sql.SQL(
+                        "INSERT INTO {} ({}) SELECT {} FROM {} ON CONFLICT ({}) {}"
+                    ).format(target, columns, columns, staging, keys, action))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+
+
+def bulk_load(
+    rows: Iterable[Dict[str, Any]],
+    table: str,
+    conflict_keys: Optional[List[str]] = None,
+    supabase: Optional[Client] = None,
+    batch_size: int = BULK_BATCH_SIZE,
+    writers: int = BULK_WRITERS,
+    update: bool = True,
+    columns: Optional[List[str]] = None,
+    database_url: str = DATABASE_URL,
+) -> Dict[str, Any]:
+    """대량 적재 (rag_chunks / normalized_inquiries 재구축, 백필용)
+
+    - database_url이 있으면 Postgres COPY, 없으면 PostgREST 배치 upsert (supabase 필요)
+    - conflict_keys가 있으면 멱등 upsert (update=False면 기존 행 유지)
+    - batch_size개씩, writers개 스레드가 병렬로 기록
+    - columns를 생략하면 첫 행의 키 사용
+    """
+    started = time.perf_counter()
+    batches = iter_batched(rows, max(1, batch_size))
+    first = next(batches, None)
+    stats = {"table": table, "mode": "copy" if database_url else "rest", "rows": 0, "batches": 0, "failed": 0}
+    if first is None:
+        stats.update(seconds=0.0, rows_per_sec=0.0)
+        return stats
+    columns = columns or list(first[0].keys())
+
+    if database_url:
+        copy_writer = _CopyWriter(database_url, table, columns, conflict_keys, update)
+        write = copy_writer.write
+    else:
+        if supabase is None:
+            raise ValueError("bulk_load needs supabase client or database_url")
+        copy_writer = None
+        get_rate_limiter("supabase", writers)
+
+        def write(batch: List[Dict[str, Any]]) -> int:
+            payload = [{c: row.get(c) for c in columns} for row in batch]
+            query = supabase.table(table)
+            if conflict_keys:
+                query = query.upsert(payload, on_conflict=",".join(conflict_keys), ignore_duplicates=not update)
+            else:
+                query = query.insert(payload)
+            call_with_rate_limit("supabase", query.execute)
+            return len(payload)
+
+    def all_batches() -> Iterator[List[Dict[str, Any]]]:
+        yield first
+        yield from batches
+
+    try:
+        for batch, written, error in iter_bounded(
+            lambda b: write(_dedupe_batch(b, conflict_keys)), all_batches(), writers
+        ):
+            stats["batches"] += 1
+            if error is not None:
+                stats["failed"] += len(batch)
+                print(f"[Bulk Load] {table} Batch Error: {str(error)}")
+            else:
+                stats["rows"] += written
+    finally:
+        if copy_writer is not None:
+            copy_writer.close()
+
+    elapsed = time.perf_counter() - started
+    stats.update(seconds=elapsed, rows_per_sec=stats["rows"] / elapsed if elapsed > 0 else 0.0)
+    print(
+        f"🚚 Bulk load {table} ({stats['mode']}): {stats['rows']} rows in {stats['batches']} batches, "
+        f"failed={stats['failed']}, {elapsed:.1f}s ({stats['rows_per_sec']:.0f} rows/s)"
+    )
+    return stats
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """JSONL 파일을 1행씩 읽기 (bulk_load 입력용)"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# ============================================================================
+# 평가 함수
+# ============================================================================
+
+# Intent Match 키워드 (evaluate_intent_match / score_intent_match_batch 공용)
+INTENT_KEYWORDS = {
+    "en": ["surgery", "treatment", "procedure", "clinic", "hospital", "consultation", "cost", "price"],
+    "ja": ["手術", "治療", "クリニック", "病院", "相談", "費用", "価格"],
+    "ko": ["수술", "치료", "병원", "상담", "비용", "가격"],
+}
+
+# Grounding 기준 (컨텍스트 키워드 중 이 비율 이상이 응답에 있으면 grounded)
+GROUNDING_THRESHOLD = 0.3
+
+
+def evaluate_intent_match(inquiry: str, response: str, lang: str) -> bool:
+    """Intent Match 평가"""
     inquiry_lower = inquiry.lower()
     response_lower = response.lower()
     
-    keywords = {
-        "en": ["surgery", "treatment", "procedure", "clinic", "hospital", "consultation", "cost", "price"],
-        "ja": ["手術", "治療", "クリニック", "病院", "相談", "費用", "価格"],
-        "ko": ["수술", "치료", "병원", "상담", "비용", "가격"],
-    }
-    
-    lang_keywords = keywords.get(lang, keywords["en"])
+    lang_keywords = INTENT_KEYWORDS.get(lang, INTENT_KEYWORDS["en"])
     medical_keywords = [kw for kw in lang_keywords if kw in inquiry_lower]
     
     if not medical_keywords:
@@ -314,88 +2958,770 @@ def evaluate_intent_match(inquiry: str, response: str, lang: str) -> bool:
     return any(kw in response_lower for kw in medical_keywords)
 
 
-def evaluate_grounding(response: str, context: str) -> bool:
-    """Grounding 평가"""
+def _grounding_keywords(context: str) -> List[str]:
+    """컨텍스트에서 주요 키워드 추출 (한글은 기존처럼 어절 단위, 가나/한자는 bigram)"""
     if not context or not context.strip():
+        return []
+    return tokenize(context, min_len=4, ngram_sizes=(2,), hangul_ngrams=False)[:10]
+
+
+def _grounded(context_words: List[str], response_normalized: str) -> bool:
+    if not context_words:
         return False
-    
-    # 컨텍스트에서 주요 키워드 추출
-    context_clean = re.sub(r"[^a-z0-9가-힣\s]", " ", context.lower())
-    context_words = [w for w in context_clean.split() if len(w) >= 4][:10]
-    
+    matches = sum(1 for w in context_words if w in response_normalized)
+    return matches / len(context_words) >= GROUNDING_THRESHOLD
+
+
+def evaluate_grounding(response: str, context: str) -> bool:
+    """Grounding 평가"""
+    context_words = _grounding_keywords(context)
     if not context_words:
         return False
     
-    # 응답이 컨텍스트 키워드를 포함하는지 확인
-    response_lower = response.lower()
-    matches = [w for w in context_words if w in response_lower]
-    
-    # 30% 이상 매칭되면 grounded로 간주
-    return len(matches) / len(context_words) >= 0.3
+    # 응답이 컨텍스트 키워드를 포함하는지 확인 (30% 이상 매칭되면 grounded로 간주)
+    response_lower = unicodedata.normalize("NFKC", response).lower()
+    return _grounded(context_words, response_lower)
+
+
+# ============================================================================
+# Grounding overlap (shingle 기반, 컨텍스트 전체 사용)
+# ============================================================================
+# evaluate_grounding은 컨텍스트 앞쪽 키워드 10개만 보므로 청크 순서에 따라 결과가 달라짐.
+# 여기서는 응답의 word/char shingle 중 컨텍스트에 있는 비율(containment)을 계산 (입력 길이에 선형)
+
+GROUNDING_SHINGLE_WORDS = 2  # word shingle 크기 (단어 bigram)
+GROUNDING_SHINGLE_CHARS = 4  # char shingle 크기 (띄어쓰기 없는 ja/ko도 비교되도록)
+
+_SHINGLE_WORD_RE = re.compile(r"\w+")
+
+
+def _normalize_for_shingles(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text or "").lower().split())
+
+
+def shingle_sets(text: str, max_hash: Optional[int] = None) -> Tuple[set, set]:
+    """텍스트 → (word shingle 집합, char shingle 집합), NFKC + 소문자 + 공백 1칸 기준
+
+    max_hash를 주면 crc32 < max_hash인 shingle의 해시만 남김 (scaled MinHash 스케치)
+    """
+    normalized = _normalize_for_shingles(text)
+    if not normalized:
+        return set(), set()
+
+    words = _SHINGLE_WORD_RE.findall(normalized)
+    n = GROUNDING_SHINGLE_WORDS
+    if len(words) < n:
+        word_shingles = [" ".join(words)] if words else []
+    else:
+        word_shingles = (" ".join(w) for w in zip(*(words[i:] for i in range(n))))
+
+    n = GROUNDING_SHINGLE_CHARS
+    if len(normalized) < n:
+        char_shingles = [normalized]
+    else:
+        char_shingles = (normalized[i:i + n] for i in range(len(normalized) - n + 1))
+
+    if max_hash is None:
+        return set(word_shingles), set(char_shingles)
+    return (
+        {h for h in (zlib.crc32(s.encode("utf-8")) for s in word_shingles) if h < max_hash},
+        {h for h in (zlib.crc32(s.encode("utf-8")) for s in char_shingles) if h < max_hash},
+    )
+
+
+def context_shingle_sets(context: str, max_hash: Optional[int] = None) -> Tuple[set, set]:
+    """컨텍스트 shingle = 청크별 shingle의 합집합 (청크 순서/경계와 무관)"""
+    words, chars = set(), set()
+    for chunk in split_context(context):
+        chunk_words, chunk_chars = shingle_sets(chunk, max_hash)
+        words |= chunk_words
+        chars |= chunk_chars
+    return words, chars
+
+
+def grounding_sketch_max_hash(context: str) -> Optional[int]:
+    """컨텍스트가 크면 scaled MinHash 임계값 (스케치 크기가 약 GROUNDING_MINHASH_MIN_SHINGLES개), 작으면 None"""
+    size = len(context or "")  # char shingle 수의 상한
+    if size <= GROUNDING_MINHASH_MIN_SHINGLES:
+        return None
+    return int((1 << 32) * GROUNDING_MINHASH_MIN_SHINGLES / size)
+
+
+def _containment(response: set, context: set) -> float:
+    """|response ∩ context| / |response|"""
+    if not response or not context:
+        return 0.0
+    return len(response & context) / len(response)
+
+
+def split_context(context: str) -> List[str]:
+    """build_context 결과를 청크 단위로 분리"""
+    return [part for part in (context or "").split("\n\n") if part.strip()]
+
+
+def grounding_overlap(
+    response: str,
+    context: str,
+    per_chunk: bool = False,
+    method: str = "auto",
+) -> Dict[str, Any]:
+    """응답이 컨텍스트에 근거한 정도 (0~1, 응답 shingle 중 컨텍스트에 있는 비율)
+
+    - word: 단어 bigram 기준 / char: 4글자 shingle 기준 / score: 두 값의 평균
+    - method: exact(집합 교집합) / minhash(scaled MinHash 스케치끼리 비교, 추정값)
+      / auto(컨텍스트가 GROUNDING_MINHASH_MIN_SHINGLES자를 넘으면 minhash)
+    - per_chunk=True면 청크별 지지도(chunks)도 반환
+    """
+    max_hash = None
+    if method == "minhash":
+        max_hash = grounding_sketch_max_hash(context) or (1 << 32)
+    elif method == "auto":
+        max_hash = grounding_sketch_max_hash(context)
+
+    response_words, response_chars = shingle_sets(response, max_hash)
+    chunk_sets = [shingle_sets(chunk, max_hash) for chunk in split_context(context)]
+    context_words = set().union(*(w for w, _ in chunk_sets))
+    context_chars = set().union(*(c for _, c in chunk_sets))
+
+    word = _containment(response_words, context_words)
+    char = _containment(response_chars, context_chars)
+    result = {
+        "word": word,
+        "char": char,
+        "score": (word + char) / 2,
+        "method": "exact" if max_hash is None else "minhash",
+    }
+
+    if per_chunk:
+        chunks = []
+        for i, (chunk_words, chunk_chars) in enumerate(chunk_sets):
+            chunk_word = _containment(response_words, chunk_words)
+            chunk_char = _containment(response_chars, chunk_chars)
+            chunks.append({
+                "chunk": i,
+                "word": chunk_word,
+                "char": chunk_char,
+                "score": (chunk_word + chunk_char) / 2,
+            })
+        result["chunks"] = chunks
+    return result
+
+
+# ============================================================================
+# 배치 재채점 (pandas, 저장된 결과 전체를 컬럼 단위로 평가)
+# ============================================================================
+
+SCORE_INPUT_COLUMNS = ["inquiry", "language", "baseline_response", "rag_response", "rag_context"]
+SCORE_OUTPUT_COLUMNS = ["intent_match_baseline", "intent_match_rag", "grounding_rag", "grounding_overlap"]
+
+
+def _as_text_list(values) -> List[str]:
+    """컬럼 → Python str 리스트 (결측값은 "")"""
+    values = values.tolist() if hasattr(values, "tolist") else list(values)
+    return [v if isinstance(v, str) else "" for v in values]
+
+
+def _compile_keyword_matcher(keywords: List[str]) -> Callable[[str], Tuple[str, ...]]:
+    """키워드 목록 → 텍스트에 들어 있는 키워드 튜플을 반환하는 함수 (정규식 1번 스캔)
+
+    lookahead로 모든 시작 위치에서 매칭하므로 겹치는 키워드도 빠지지 않음.
+    같은 위치에서는 긴 키워드만 잡히므로, 잡힌 키워드 안에 들어 있는 키워드도 포함시킴.
+    결과 순서는 keywords 순서 (`kw in text` 루프와 같은 집합)
+    """
+    ordered = sorted(set(keywords), key=len, reverse=True)
+    pattern = re.compile("(?=(" + "|".join(re.escape(kw) for kw in ordered) + "))")
+    contained = {kw: {other for other in keywords if other in kw} for kw in keywords}
+
+    def find(text: str) -> Tuple[str, ...]:
+        found = set()
+        for kw in set(pattern.findall(text)):
+            found |= contained[kw]
+        return tuple(kw for kw in keywords if kw in found)
+
+    return find
+
+
+_INTENT_MATCHERS = {lang: _compile_keyword_matcher(kws) for lang, kws in INTENT_KEYWORDS.items()}
+
+
+def score_intent_match_batch(inquiries, responses, langs):
+    """evaluate_intent_match 배치 버전 (결과 동일, bool numpy 배열)
+
+    문의에 들어 있는 키워드는 고유 (문의, 언어)마다 1번만 찾고 (평가 문의는 반복이 많음),
+    응답은 그 키워드만 확인
+    """
+    import numpy as np
+
+    inquiries = _as_text_list(inquiries)
+    responses = _as_text_list(responses)
+    langs = _as_text_list(langs)
+
+    asked_by_inquiry: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+    result = np.ones(len(inquiries), dtype=bool)
+    for i, (inquiry, response, lang) in enumerate(zip(inquiries, responses, langs)):
+        asked = asked_by_inquiry.get((inquiry, lang))
+        if asked is None:
+            matcher = _INTENT_MATCHERS.get(lang, _INTENT_MATCHERS["en"])
+            asked = asked_by_inquiry[(inquiry, lang)] = matcher(inquiry.lower())
+        # 문의에 의료 키워드가 없으면 True (evaluate_intent_match와 동일)
+        if asked:
+            response_lower = response.lower()
+            result[i] = any(kw in response_lower for kw in asked)
+    return result
+
+
+def score_grounding_batch(responses, contexts):
+    """evaluate_grounding 배치 버전 (결과 동일, bool numpy 배열)
+
+    컨텍스트 키워드는 고유 컨텍스트마다 1번만 추출 (검색 결과가 같은 문의는 컨텍스트도 같음)
+    """
+    import numpy as np
+
+    keywords_by_context: Dict[str, List[str]] = {}
+    contexts = _as_text_list(contexts)
+    responses = _as_text_list(responses)
+    result = np.zeros(len(contexts), dtype=bool)
+    for i, (context, response) in enumerate(zip(contexts, responses)):
+        words = keywords_by_context.get(context)
+        if words is None:
+            words = keywords_by_context[context] = _grounding_keywords(context)
+        if words:
+            # ASCII는 NFKC 결과가 같으므로 정규화 생략
+            if not response.isascii():
+                response = unicodedata.normalize("NFKC", response)
+            result[i] = _grounded(words, response.lower())
+    return result
+
+
+def score_grounding_overlap_batch(responses, contexts):
+    """grounding_overlap(...)["score"] 배치 버전 (float numpy 배열, 고유 컨텍스트마다 shingle 1번 계산)"""
+    import numpy as np
+
+    context_shingles: Dict[str, Tuple[Optional[int], set, set]] = {}
+    contexts = _as_text_list(contexts)
+    responses = _as_text_list(responses)
+    result = np.zeros(len(contexts), dtype=float)
+    for i, (context, response) in enumerate(zip(contexts, responses)):
+        cached = context_shingles.get(context)
+        if cached is None:
+            max_hash = grounding_sketch_max_hash(context)
+            cached = context_shingles[context] = (max_hash, *context_shingle_sets(context, max_hash))
+        max_hash, context_words, context_chars = cached
+        response_words, response_chars = shingle_sets(response, max_hash)
+        result[i] = (
+            _containment(response_words, context_words)
+            + _containment(response_chars, context_chars)
+        ) / 2
+    return result
+
+
+def score_results(frame):
+    """결과 프레임(pandas DataFrame / Arrow Table) 전체 채점
+
+    입력 컬럼: inquiry, language, baseline_response, rag_response, rag_context
+    반환: intent_match_baseline / intent_match_rag / grounding_rag (bool), grounding_overlap (float) 컬럼 DataFrame
+    """
+    import pandas as pd
+
+    if hasattr(frame, "to_pandas"):
+        frame = frame.select(SCORE_INPUT_COLUMNS).to_pandas()
+    missing = [c for c in SCORE_INPUT_COLUMNS if c not in frame.columns]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+
+    return pd.DataFrame({
+        "intent_match_baseline": score_intent_match_batch(
+            frame["inquiry"], frame["baseline_response"], frame["language"]
+        ),
+        "intent_match_rag": score_intent_match_batch(
+            frame["inquiry"], frame["rag_response"], frame["language"]
+        ),
+        "grounding_rag": score_grounding_batch(frame["rag_response"], frame["rag_context"]),
+        "grounding_overlap": score_grounding_overlap_batch(frame["rag_response"], frame["rag_context"]),
+    }, index=frame.index)
+
+
+def rescore_csv(
+    input_path: str,
+    output_path: Optional[str] = None,
+    chunksize: int = 100_000,
+) -> Dict[str, Any]:
+    """저장된 평가 CSV를 현재 채점 기준으로 다시 채점 (LLM/DB 호출 없음)
+
+    나머지 컬럼은 그대로 두고 SCORE_OUTPUT_COLUMNS만 교체(없는 컬럼, 예: 이전 CSV의 grounding_overlap은
+    앞 점수 컬럼 뒤에 추가), chunksize행씩 스트리밍
+    """
+    import pandas as pd
+
+    output_path = output_path or os.path.splitext(input_path)[0] + "_rescored.csv"
+    stats = {"rows": 0, "changed": 0, **{c: 0 for c in SCORE_OUTPUT_COLUMNS}}
+    started = time.perf_counter()
+
+    reader = pd.read_csv(input_path, dtype=str, keep_default_na=False, chunksize=chunksize)
+    with open(output_path + ".tmp", "w", newline="", encoding="utf-8") as f:
+        for i, chunk in enumerate(reader):
+            scores = score_results(chunk)
+            for column in SCORE_OUTPUT_COLUMNS:
+                if scores[column].dtype == bool:
+                    values = scores[column].map({True: "true", False: "false"})
+                else:
+                    values = scores[column].map(_format_ratio)
+                if column in chunk.columns:
+                    stats["changed"] += int((chunk[column] != values).sum())
+                    chunk[column] = values
+                else:
+                    # 이전 버전 CSV: CSV_FIELDNAMES 순서 위치에 컬럼 추가
+                    previous = SCORE_OUTPUT_COLUMNS[:SCORE_OUTPUT_COLUMNS.index(column)]
+                    loc = max([chunk.columns.get_loc(c) + 1 for c in previous if c in chunk.columns], default=len(chunk.columns))
+                    chunk.insert(loc, column, values)
+                stats[column] += scores[column].sum().item()
+            stats["rows"] += len(chunk)
+            chunk.to_csv(f, index=False, header=(i == 0))
+    os.replace(output_path + ".tmp", output_path)
+
+    elapsed = time.perf_counter() - started
+    stats["output_path"] = output_path
+    stats["rows_per_sec"] = stats["rows"] / elapsed if elapsed > 0 else 0.0
+    print(
+        f"\n🔁 Rescored {stats['rows']} rows in {elapsed:.1f}s ({stats['rows_per_sec']:.0f} rows/s), "
+        f"changed values={stats['changed']} → {output_path}"
+    )
+    return stats
 
 
 # ============================================================================
 # 출력 함수
 # ============================================================================
 
+CSV_FIELDNAMES = [
+    "inquiry_id", "inquiry", "language",
+    "baseline_response", "rag_response", "rag_context",
+    "intent_match_baseline", "intent_match_rag", "grounding_rag", "grounding_overlap",
+    "normalized_data", "corpus_version", "context_tokens", "context_tokens_saved"
+] + [f"latency_{stage}_ms" for stage in LATENCY_STAGES]
+
+
+def format_csv_row(r: Dict[str, Any]) -> Dict[str, Any]:
+    """결과 1건을 CSV 행으로 변환"""
+    return {
+        "inquiry_id": r["inquiry_id"],
+        "inquiry": r["inquiry"],
+        "language": r["language"],
+        "baseline_response": r["baseline_response"],
+        "rag_response": r["rag_response"],
+        "rag_context": r["rag_context"],
+        "intent_match_baseline": "true" if r["intent_match_baseline"] else "false",
+        "intent_match_rag": "true" if r["intent_match_rag"] else "false",
+        "grounding_rag": "true" if r["grounding_rag"] else "false",
+        "grounding_overlap": _format_ratio(r.get("grounding_overlap")),
+        "normalized_data": json.dumps(r["normalized_data"] or {}),
+        "corpus_version": r.get("corpus_version", ""),
+        "context_tokens": _format_count(r.get("context_tokens")),
+        "context_tokens_saved": _format_count(r.get("context_tokens_saved")),
+        **{
+            f"latency_{stage}_ms": _format_ms(r.get(f"latency_{stage}_ms"))
+            for stage in LATENCY_STAGES
+        },
+    }
+
+
+def _format_ms(value: Optional[float]) -> str:
+    return f"{value:.1f}" if value is not None else ""
+
+
+def _format_count(value: Optional[int]) -> str:
+    return str(value) if value is not None else ""
+
+
+def _format_ratio(value: Optional[float]) -> str:
+    return f"{value:.3f}" if value is not None else ""
+
+
 def write_csv(results: List[Dict], output_path: str):
     """CSV 출력"""
     if not results:
         return
     
-    fieldnames = [
-        "inquiry_id", "inquiry", "language",
-        "baseline_response", "rag_response", "rag_context",
-        "intent_match_baseline", "intent_match_rag", "grounding_rag",
-        "normalized_data"
-    ]
-    
     with open(output_path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDNAMES)
         writer.writeheader()
         
         for r in results:
-            writer.writerow({
-                "inquiry_id": r["inquiry_id"],
-                "inquiry": r["inquiry"],
-                "language": r["language"],
-                "baseline_response": r["baseline_response"],
-                "rag_response": r["rag_response"],
-                "rag_context": r["rag_context"],
-                "intent_match_baseline": "true" if r["intent_match_baseline"] else "false",
-                "intent_match_rag": "true" if r["intent_match_rag"] else "false",
-                "grounding_rag": "true" if r["grounding_rag"] else "false",
-                "normalized_data": json.dumps(r["normalized_data"] or {}),
-            })
+            writer.writerow(format_csv_row(r))
     
     print(f"\n✅ CSV saved to: {output_path}")
 
 
-def print_statistics(results: List[Dict]):
-    """통계 출력"""
-    total = len(results)
-    intent_match_baseline = sum(1 for r in results if r["intent_match_baseline"])
-    intent_match_rag = sum(1 for r in results if r["intent_match_rag"])
-    grounding_rag = sum(1 for r in results if r["grounding_rag"])
+class EvaluationStats:
+    """통계용 온라인 집계기 (결과 목록을 메모리에 두지 않음)"""
+
+    def __init__(self):
+        self.total = 0
+        self.intent_match_baseline = 0
+        self.intent_match_rag = 0
+        self.grounding_rag = 0
+        self.grounding_overlap_sum = 0.0
+        self.grounding_overlap_count = 0
+        self.context_tokens = 0
+        self.context_tokens_saved = 0
+        self.context_count = 0
+        # (stage, language) -> 지연 시간 스케치, language "all"은 전체
+        self.latency: Dict[Tuple[str, str], QuantileSketch] = {}
+
+    def add(self, r: Dict[str, Any]):
+        self.total += 1
+        self.intent_match_baseline += 1 if r["intent_match_baseline"] else 0
+        self.intent_match_rag += 1 if r["intent_match_rag"] else 0
+        self.grounding_rag += 1 if r["grounding_rag"] else 0
+        if r.get("grounding_overlap") is not None:
+            self.grounding_overlap_sum += r["grounding_overlap"]
+            self.grounding_overlap_count += 1
+        if r.get("context_tokens") is not None:
+            self.context_tokens += r["context_tokens"]
+            self.context_tokens_saved += r.get("context_tokens_saved") or 0
+            self.context_count += 1
+        for stage in LATENCY_STAGES:
+            value = r.get(f"latency_{stage}_ms")
+            if value is None:
+                continue
+            for lang in ("all", r["language"]):
+                key = (stage, lang)
+                if key not in self.latency:
+                    self.latency[key] = QuantileSketch()
+                self.latency[key].add(value)
+
+    @classmethod
+    def from_results(cls, results: List[Dict]) -> "EvaluationStats":
+        stats = cls()
+        for r in results:
+            stats.add(r)
+        return stats
+
+
+class StreamingResultWriter:
+    """결과를 1건씩 CSV에 이어 쓰는 writer (flush_every건마다 flush + 온라인 통계 집계)"""
+
+    def __init__(self, output_path: str, flush_every: int = EVAL_FLUSH_EVERY):
+        self.output_path = output_path
+        self.flush_every = max(1, flush_every)
+        self.stats = EvaluationStats()
+        self._file = open(output_path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=CSV_FIELDNAMES)
+        self._writer.writeheader()
+
+    def write(self, result: Dict[str, Any]):
+        self._writer.writerow(format_csv_row(result))
+        self.stats.add(result)
+        if self.stats.total % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+        print(f"\n✅ CSV saved to: {self.output_path} ({self.stats.total} rows)")
+
+
+def print_statistics(results):
+    """통계 출력 (결과 목록 또는 EvaluationStats)"""
+    stats = results if isinstance(results, EvaluationStats) else EvaluationStats.from_results(results)
+    total = stats.total
+    intent_match_baseline = stats.intent_match_baseline
+    intent_match_rag = stats.intent_match_rag
+    grounding_rag = stats.grounding_rag
     
     print("\n" + "=" * 60)
     print("📊 Evaluation Statistics")
     print("=" * 60)
     print(f"Total Inquiries: {total}")
+    if not total:
+        print("=" * 60)
+        return
     print(f"\nIntent Match:")
     print(f"  Baseline LLM: {intent_match_baseline}/{total} ({intent_match_baseline/total*100:.1f}%)")
     print(f"  RAG + Normalize: {intent_match_rag}/{total} ({intent_match_rag/total*100:.1f}%)")
     print(f"\nGrounding (RAG):")
     print(f"  RAG Response Grounded: {grounding_rag}/{total} ({grounding_rag/total*100:.1f}%)")
+    if stats.grounding_overlap_count:
+        mean_overlap = stats.grounding_overlap_sum / stats.grounding_overlap_count
+        print(f"  Shingle Overlap (mean): {mean_overlap:.3f}")
+    if stats.context_count:
+        full = stats.context_tokens + stats.context_tokens_saved
+        saved_pct = stats.context_tokens_saved / full * 100 if full else 0.0
+        print(f"\nContext Tokens (RAG):")
+        print(f"  Mean per inquiry: {stats.context_tokens / stats.context_count:.0f}")
+        print(f"  Saved by packing: {stats.context_tokens_saved} ({saved_pct:.1f}%)")
+    if stats.latency:
+        print(f"\nLatency (ms, p50 / p95 / p99):")
+        langs = sorted({lang for _, lang in stats.latency if lang != "all"})
+        for stage in LATENCY_STAGES:
+            for lang in ["all"] + langs:
+                sketch = stats.latency.get((stage, lang))
+                if sketch is None:
+                    continue
+                label = stage if lang == "all" else f"  └ {lang}"
+                print(
+                    f"  {label:<14} {sketch.quantile(0.5):>8.1f} / "
+                    f"{sketch.quantile(0.95):>8.1f} / {sketch.quantile(0.99):>8.1f}  (n={sketch.count})"
+                )
     print("=" * 60)
 
 
+# ============================================================================
+# 체크포인트 / 재개
+# ============================================================================
+
+def load_checkpoint(path: str) -> Dict[int, int]:
+    """저널에서 완료된 문의의 위치 로드 {inquiry_id: byte offset} (중간에 끊긴 마지막 줄은 잘라냄)"""
+    offsets: Dict[int, int] = {}
+    if not os.path.exists(path):
+        return offsets
+
+    valid_bytes = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # 기록 중 종료된 줄
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            offsets[record["inquiry_id"]] = valid_bytes
+            valid_bytes += len(line)
+
+    # 깨진 꼬리를 남겨두면 이어 쓰는 첫 줄까지 손상되므로 정리
+    if valid_bytes < os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return offsets
+
+
+class CheckpointJournal:
+    """Append-only 체크포인트 저널 (완료된 문의 1건 = JSON 1줄)
+
+    재개 시에는 결과 본문 대신 오프셋만 메모리에 두고 필요할 때 읽음
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.completed = load_checkpoint(path) if resume else {}
+        self._lock = threading.Lock()
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+        self._reader = None
+
+    def read(self, inquiry_id: int) -> Dict[str, Any]:
+        """이전 실행에서 완료된 결과 1건 읽기"""
+        with self._lock:
+            if self._reader is None:
+                self._reader = open(self.path, "rb")
+            self._reader.seek(self.completed[inquiry_id])
+            return json.loads(self._reader.readline())
+
+    def record(self, result: Dict[str, Any]):
+        line = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            # 커널이 죽어도 OS 버퍼에 남도록 매 건 flush
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            if self._reader is not None:
+                self._reader.close()
+
+
+# ============================================================================
+# 동시 실행 엔진 (asyncio)
+# ============================================================================
+
+def evaluate_inquiry(
+    inquiry: Dict[str, Any],
+    baseline_response: str,
+    rag_response: str,
+    rag_context: str,
+    normalized: Dict,
+    metrics: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """문의 1건의 응답을 평가해서 결과 행 생성 (metrics: 단계별 지연 시간 등)"""
+    language = resolve_language(inquiry.get("lang"), inquiry["text"])
+    intent_match_baseline = evaluate_intent_match(
+        inquiry["text"], baseline_response, language
+    )
+    intent_match_rag = evaluate_intent_match(
+        inquiry["text"], rag_response, language
+    )
+    grounding_rag = evaluate_grounding(rag_response, rag_context)
+    overlap = grounding_overlap(rag_response, rag_context)["score"]
+
+    return {
+        "inquiry_id": inquiry["id"],
+        "inquiry": inquiry["text"],
+        "language": language,
+        "baseline_response": baseline_response,
+        "rag_response": rag_response,
+        "rag_context": rag_context,
+        "intent_match_baseline": intent_match_baseline,
+        "intent_match_rag": intent_match_rag,
+        "grounding_rag": grounding_rag,
+        "grounding_overlap": overlap,
+        "normalized_data": normalized,
+        "corpus_version": current_corpus_version(),
+        **(metrics or {}),
+    }
+
+
+async def _run_in_slot(semaphore: asyncio.Semaphore, func, *args):
+    """동시 실행 슬롯을 확보한 뒤 동기 함수를 스레드에서 실행 (pacing은 AdaptiveRateLimiter가 담당)"""
+    async with semaphore:
+        return await asyncio.to_thread(func, *args)
+
+
+async def run_evaluation_async(
+    inquiries: Iterable[Dict[str, Any]],
+    supabase: Client,
+    concurrency: int = EVAL_CONCURRENCY,
+    journal: Optional[CheckpointJournal] = None,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+    total: Optional[int] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """문의를 동시에 평가하고 입력 순서대로 on_result에 전달
+
+    - 워커 concurrency개가 문의를 하나씩 가져가므로 전체 목록을 한 번에 띄우지 않음
+    - 입력 iterator(RAG 미리 검색 등 블로킹 I/O 포함)는 producer가 스레드에서 꺼내 큐로 전달
+      (이벤트 루프가 네트워크 대기로 멈추지 않도록)
+    - 순서 맞추기 버퍼는 concurrency * 4건으로 제한 (메모리 상한)
+    - journal에 이미 있는 문의는 호출 없이 기록된 결과를 재사용
+    - on_result가 없으면 결과 목록을 반환
+    """
+    concurrency = max(1, concurrency)
+    loop = asyncio.get_running_loop()
+    # 기본 스레드 풀(min(32, CPU+4))보다 동시 실행 수가 크면 호출이 풀에서 대기하게 됨 (+1은 producer)
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency + 1))
+    semaphore = asyncio.Semaphore(concurrency)
+    if total is None and hasattr(inquiries, "__len__"):
+        total = len(inquiries)
+    progress_every = max(10, (total or 0) // 100)
+
+    collected: Optional[List[Dict[str, Any]]] = None
+    if on_result is None:
+        collected = []
+        on_result = collected.append
+
+    source = enumerate(inquiries)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    done = object()
+    producer_error: List[BaseException] = []
+    max_pending = concurrency * 4
+    ready: Dict[int, Dict[str, Any]] = {}
+    next_seq = 0
+    window = asyncio.Condition()
+
+    async def process(inquiry: Dict[str, Any]) -> Dict[str, Any]:
+        if journal is not None and inquiry["id"] in journal.completed:
+            return journal.read(inquiry["id"])
+
+        # 두 arm의 단계별 시간이 이 dict에 기록됨 (gather가 만드는 task가 현재 context를 복사)
+        metrics: Dict[str, Any] = {}
+        token = _inquiry_metrics.set(metrics)
+        try:
+            # Baseline LLM과 RAG + Normalize를 동시에 호출
+            baseline_response, (rag_response, rag_context, normalized) = await asyncio.gather(
+                _run_in_slot(semaphore, get_baseline_response, inquiry["text"], inquiry.get("lang")),
+                _run_in_slot(semaphore, get_rag_response, inquiry["text"], inquiry.get("lang"), supabase),
+            )
+        finally:
+            _inquiry_metrics.reset(token)
+        result = evaluate_inquiry(
+            inquiry, baseline_response, rag_response, rag_context, normalized, metrics
+        )
+        if journal is not None:
+            journal.record(result)
+        return result
+
+    def take(n: int) -> List[Tuple[int, Dict[str, Any]]]:
+        return [item for _, item in zip(range(n), source)]
+
+    async def producer():
+        # next()는 이 task만 호출 (한 번에 스레드 1개), concurrency개씩 꺼내 스레드 전환 횟수를 줄임
+        try:
+            while True:
+                items = await asyncio.to_thread(take, concurrency)
+                for item in items:
+                    await queue.put(item)
+                if len(items) < concurrency:
+                    break
+        except Exception as e:
+            producer_error.append(e)
+        await queue.put(done)
+
+    async def worker():
+        nonlocal next_seq
+        while True:
+            item = await queue.get()
+            if item is done:
+                # 다른 워커도 끝나도록 종료 표시를 다시 넣음 (방금 1칸 비웠으므로 가득 차지 않음)
+                queue.put_nowait(done)
+                return
+            seq, inquiry = item
+            async with window:
+                await window.wait_for(lambda: seq < next_seq + max_pending)
+
+            result = await process(inquiry)
+
+            async with window:
+                ready[seq] = result
+                while next_seq in ready:
+                    on_result(ready.pop(next_seq))
+                    next_seq += 1
+                    # 진행률 표시
+                    if next_seq % progress_every == 0:
+                        if total:
+                            print(f"📈 Progress: {next_seq}/{total} ({next_seq/total*100:.1f}%)")
+                        else:
+                            print(f"📈 Progress: {next_seq}")
+                window.notify_all()
+
+    await asyncio.gather(producer(), *(worker() for _ in range(concurrency)))
+    if producer_error:
+        raise producer_error[0]
+    return collected
+
+
+def run_evaluation(
+    inquiries: Iterable[Dict[str, Any]],
+    supabase: Client,
+    concurrency: int = EVAL_CONCURRENCY,
+    journal: Optional[CheckpointJournal] = None,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+    total: Optional[int] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """동기 코드에서 평가 실행 (Colab/Jupyter처럼 이벤트 루프가 이미 돌고 있으면 별도 스레드 사용)"""
+    coro = run_evaluation_async(inquiries, supabase, concurrency, journal, on_result, total)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
 # ============================================================================
 # 메인 실행
 # ============================================================================
 
-def main():
-    """메인 실행 함수"""
+def main(
+    count: int = 200,
+    concurrency: int = EVAL_CONCURRENCY,
+    resume: bool = False,
+    checkpoint_path: str = EVAL_CHECKPOINT_PATH,
+    collect_results: bool = True,
+):
+    """메인 실행 함수
+
+    - resume=True면 체크포인트에 기록된 문의는 다시 호출하지 않음
+    - collect_results=False면 결과를 CSV에만 쓰고 메모리에 모으지 않음 (대규모 실행용);
+      이때 결과 목록 대신 집계 통계(EvaluationStats)를 반환
+    """
     print("🚀 HEALO RAG Evaluation Script (Colab)")
     print("=" * 60)
     
@@ -410,70 +3736,105 @@ def main():
         print("❌ Error: SUPABASE_URL and SUPABASE_SERVICE_KEY are required")
         return
     
-    # Supabase 클라이언트
+    # Supabase / LLM 클라이언트 (실행 동안 재사용)
     supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    get_llm_client(LLM_PROVIDER, pool_size=concurrency)
+    get_rate_limiter(LLM_PROVIDER, max_concurrency=concurrency)
+    get_rate_limiter("supabase", max_concurrency=concurrency)
     
-    # 가상 문의 생성
-    print("\n📝 Generating 200 virtual inquiries (multilingual)...")
-    inquiries = generate_inquiries(200)
-    print(f"✅ Generated {len(inquiries)} inquiries")
+    if RAG_SNAPSHOT_PATH:
+        if RAG_BACKEND == "local":
+            print(f"📦 RAG snapshot: {RAG_SNAPSHOT_PATH} (corpus_version={get_rag_snapshot().corpus_version})")
+        else:
+            print("⚠️  RAG_SNAPSHOT_PATH is only used with RAG_BACKEND=local")
+
+    # 가상 문의는 필요할 때 하나씩 생성
+    print(f"\n📝 Streaming {count} virtual inquiries (multilingual)...")
+    inquiries = iter_inquiries(count)
     
-    # 평가 실행
-    print("\n🔄 Running evaluation...")
-    results = []
+    # 체크포인트
+    journal = CheckpointJournal(checkpoint_path, resume=resume)
+    if resume:
+        done = len(journal.completed)
+        print(f"♻️  Resuming from {checkpoint_path}: {done} done, {max(0, count - done)} remaining")
     
-    for i, inquiry in enumerate(inquiries):
-        print(f"\n[{i+1}/{len(inquiries)}] Processing: {inquiry['text'][:50]}...")
-        
-        # Baseline LLM
-        print("  → Baseline LLM...")
-        baseline_response = get_baseline_response(inquiry["text"], inquiry["lang"])
-        time.sleep(0.5)  # Rate limiting
-        
-        # RAG + Normalize
-        print("  → RAG + Normalize...")
-        rag_response, rag_context, normalized = get_rag_response(
-            inquiry["text"], inquiry["lang"], supabase
-        )
-        time.sleep(0.5)  # Rate limiting
-        
-        # 평가
-        intent_match_baseline = evaluate_intent_match(
-            inquiry["text"], baseline_response, inquiry["lang"]
-        )
-        intent_match_rag = evaluate_intent_match(
-            inquiry["text"], rag_response, inquiry["lang"]
-        )
-        grounding_rag = evaluate_grounding(rag_response, rag_context)
-        
-        results.append({
-            "inquiry_id": inquiry["id"],
-            "inquiry": inquiry["text"],
-            "language": inquiry["lang"],
-            "baseline_response": baseline_response,
-            "rag_response": rag_response,
-            "rag_context": rag_context,
-            "intent_match_baseline": intent_match_baseline,
-            "intent_match_rag": intent_match_rag,
-            "grounding_rag": grounding_rag,
-            "normalized_data": normalized,
-        })
-        
-        # 진행률 표시
-        if (i + 1) % 10 == 0:
-            print(f"\n📈 Progress: {i+1}/{len(inquiries)} ({(i+1)/len(inquiries)*100:.1f}%)")
+    # RAG 검색은 문의 RAG_PREFETCH_BATCH개씩 1번의 요청으로 미리 가져와 캐시에 채움
+    if RAG_BACKEND == "rpc" and RAG_PREFETCH_BATCH > 0 and get_retrieval_cache() is not None:
+        inquiries = iter_with_rag_prefetch(inquiries, supabase, RAG_PREFETCH_BATCH, skip=journal.completed)
     
-    # 결과 저장
+    # 결과는 완료 순서와 무관하게 문의 순서대로 CSV에 바로 기록
     timestamp = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
     csv_path = f"evaluation_{timestamp}.csv"
-    write_csv(results, csv_path)
+    writer = StreamingResultWriter(csv_path)
+    results: List[Dict[str, Any]] = []
+
+    def on_result(result: Dict[str, Any]):
+        writer.write(result)
+        if collect_results:
+            results.append(result)
+    
+    # 평가 실행
+    print(f"\n🔄 Running evaluation (concurrency={concurrency})...")
+    try:
+        run_evaluation(inquiries, supabase, concurrency, journal, on_result, total=count)
+    finally:
+        journal.close()
+        writer.close()
+        close_normalization_writer()
     
     # 통계 출력
-    print_statistics(results)
+    print_statistics(writer.stats)
+    print_rate_limit_stats()
+    print_connection_stats()
+    print_cache_stats()
+    print_retrieval_cache_stats()
+    print_normalization_stats()
     
     print("\n✅ Evaluation completed!")
-    return results, csv_path
+    return (results if collect_results else writer.stats), csv_path
+
 
+# Colab/Jupyter에서 exec(open(...).read()) 또는 셀 붙여넣기로 실행하면 __name__이 "__main__"이고
+# sys.argv가 커널 인자(-f kernel.json)라서 CLI 파싱을 건너뜀 (main()은 직접 호출)
+if __name__ == "__main__" and "ipykernel" not in sys.modules:
+    parser = argparse.ArgumentParser(description="HEALO RAG evaluation")
+    parser.add_argument("--count", type=int, default=200, help="생성할 가상 문의 수")
+    parser.add_argument("--concurrency", type=int, default=EVAL_CONCURRENCY, help="동시 호출 수")
+    parser.add_argument("--resume", action="store_true", help="체크포인트에서 완료된 문의는 건너뜀")
+    parser.add_argument("--checkpoint", default=EVAL_CHECKPOINT_PATH, help="체크포인트 저널 경로")
+    parser.add_argument("--bulk-load", metavar="JSONL", help="평가 대신 JSONL 파일을 --table에 대량 적재")
+    parser.add_argument("--table", help="--bulk-load 대상 테이블 (예: rag_chunks)")
+    parser.add_argument("--conflict", default="", help="--bulk-load upsert 충돌 키 (쉼표 구분, 예: document_id,chunk_index)")
+    parser.add_argument("--rescore", metavar="CSV", help="평가 대신 저장된 결과 CSV를 다시 채점")
+    parser.add_argument("--output", help="--rescore 결과 경로 (기본: <CSV>_rescored.csv)")
+    args = parser.parse_args()
+
+    if args.rescore:
+        rescore_csv(args.rescore, args.output)
+        raise SystemExit(0)
+
+    if args.bulk_load:
+        if not args.table:
+            parser.error("--bulk-load requires --table")
+        bulk_load(
+            iter_jsonl(args.bulk_load),
+            args.table,
+            conflict_keys=[k for k in args.conflict.split(",") if k] or None,
+            supabase=None if DATABASE_URL else create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY),
+        )
+        raise SystemExit(0)
 
-if __name__ == "__main__":
-    results, csv_path = main()
+    # CLI는 결과를 CSV로만 남기므로 메모리에 모으지 않음
+    outcome = main(
+        count=args.count,
+        concurrency=args.concurrency,
+        resume=args.resume,
+        checkpoint_path=args.checkpoint,
+        collect_results=False,
+    )
+    if outcome is None:
+        raise SystemExit(1)
+    stats, csv_path = outcome
+    if stats.total == 0 and not args.resume:
+        print(f"❌ Error: no results written to {csv_path}")
+        raise SystemExit(1)
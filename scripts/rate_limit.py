@@ -0,0 +1,212 @@
+"""
+HEALO 평가 스크립트 공용 Rate Limiter
+
+evaluation_colab.py / colab_complete.py가 함께 사용
+(Colab에서는 이 파일을 같은 작업 디렉터리에 업로드)
+
+- 프로바이더(openai / google / supabase)별 토큰 버킷 + AIMD
+- 429면 RPS/동시 실행 수를 절반으로 줄이고 백오프 후 재시도
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# 프로바이더별 (초기 RPS, 최대 RPS)
+RATE_LIMIT_DEFAULTS = {
+    "openai": (5.0, 50.0),
+    "google": (2.0, 30.0),
+    "supabase": (20.0, 200.0),
+}
+RATE_LIMIT_MAX_RETRIES = 5  # 429 재시도 횟수
+RATE_LIMIT_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "8"))  # 프로바이더별 기본 동시 실행 수
+
+
+class AdaptiveRateLimiter:
+    """토큰 버킷 + AIMD 방식의 적응형 Rate Limiter
+
+    - 429(rate limit) 발생 시 RPS와 동시 실행 수를 절반으로 줄이고 백오프
+    - 성공이 이어지면 RPS와 동시 실행 수를 조금씩 다시 올림
+    """
+
+    MIN_RATE = 0.1
+    INCREASE_STEP = 1.0  # additive increase (초당 RPS)
+
+    def __init__(self, name: str, rate: float, max_rate: float, max_concurrency: int):
+        self.name = name
+        self.rate = rate
+        self.max_rate = max_rate
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = self.max_concurrency
+
+        self._cond = threading.Condition()
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._active = 0
+        self._success_streak = 0
+
+        # 통계
+        self._started_at = None
+        self.requests = 0
+        self.tokens_used = 0
+        self.throttled = 0
+        self.errors = 0
+
+    def _refill(self, now: float):
+        capacity = max(1.0, self.rate)  # 최대 1초 분량까지 버스트 허용
+        self._tokens = min(capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """토큰과 동시 실행 슬롯이 생길 때까지 대기"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._started_at is None:
+                    self._started_at = now
+                self._refill(now)
+
+                if now < self._blocked_until:
+                    self._cond.wait(self._blocked_until - now)
+                elif self._active >= self.concurrency:
+                    self._cond.wait()
+                elif self._tokens < 1.0:
+                    self._cond.wait((1.0 - self._tokens) / self.rate)
+                else:
+                    self._tokens -= 1.0
+                    self._active += 1
+                    return
+
+    def on_success(self, tokens: int = 0):
+        """성공: 슬롯 반환 + RPS/동시 실행 수 additive increase"""
+        with self._cond:
+            self._active -= 1
+            self.requests += 1
+            self.tokens_used += tokens
+            # 성공 1건당 INCREASE_STEP / rate → 초당 약 INCREASE_STEP RPS씩 증가
+            # (rate가 낮을 때 1건 성공으로 급증하지 않도록 한 번에 최대 2배까지만)
+            increase = min(self.INCREASE_STEP / self.rate, self.rate)
+            self.rate = min(self.max_rate, self.rate + increase)
+            self._success_streak += 1
+            if self._success_streak >= self.concurrency and self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+                self._success_streak = 0
+            self._cond.notify_all()
+
+    def on_rate_limited(self, attempt: int) -> float:
+        """429: 슬롯 반환 + multiplicative decrease, 백오프 시간(초) 반환"""
+        with self._cond:
+            self._active -= 1
+            self.throttled += 1
+            self.rate = max(self.MIN_RATE, self.rate / 2)
+            self.concurrency = max(1, self.concurrency // 2)
+            self._success_streak = 0
+            delay = min(60.0, 2 ** attempt) * (0.5 + random.random())
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            self._cond.notify_all()
+            return delay
+
+    def on_error(self):
+        """기타 오류: 슬롯만 반환"""
+        with self._cond:
+            self._active -= 1
+            self.errors += 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """실제 달성한 처리량 통계"""
+        with self._cond:
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+            return {
+                "provider": self.name,
+                "requests": self.requests,
+                "tokens": self.tokens_used,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "elapsed_sec": elapsed,
+                "requests_per_sec": self.requests / elapsed if elapsed else 0.0,
+                "tokens_per_sec": self.tokens_used / elapsed if elapsed else 0.0,
+                "current_rate": self.rate,
+                "current_concurrency": self.concurrency,
+            }
+
+
+_rate_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, max_concurrency: Optional[int] = None) -> AdaptiveRateLimiter:
+    """프로바이더별 Rate Limiter (openai / google / supabase)
+
+    max_concurrency는 처음 만들 때만 적용 (기본: RATE_LIMIT_CONCURRENCY)
+    """
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(provider)
+        if limiter is None:
+            rate, max_rate = RATE_LIMIT_DEFAULTS.get(provider, (5.0, 50.0))
+            limiter = AdaptiveRateLimiter(
+                provider, rate, max_rate,
+                RATE_LIMIT_CONCURRENCY if max_concurrency is None else max_concurrency,
+            )
+            _rate_limiters[provider] = limiter
+        return limiter
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """429 / quota 초과 오류인지 판별 (OpenAI, Gemini, PostgREST 공통)"""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if str(status) == "429":
+        return True
+    if type(error).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests"):
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message
+
+
+def _usage_tokens(response: Any) -> int:
+    """응답 객체에서 사용 토큰 수 추출 (없으면 0)"""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        return getattr(usage, "total_tokens", 0) or 0
+    usage_metadata = getattr(response, "usage_metadata", None)
+    if usage_metadata is not None:
+        return getattr(usage_metadata, "total_token_count", 0) or 0
+    return 0
+
+
+def call_with_rate_limit(provider: str, func, *args, **kwargs):
+    """Rate Limiter를 거쳐 호출 (429면 백오프 후 재시도)"""
+    limiter = get_rate_limiter(provider)
+    for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if is_rate_limit_error(e) and attempt < RATE_LIMIT_MAX_RETRIES:
+                delay = limiter.on_rate_limited(attempt)
+                print(f"[RateLimit] {provider} throttled, retry in {delay:.1f}s")
+                continue
+            limiter.on_error()
+            raise
+        limiter.on_success(_usage_tokens(result))
+        return result
+
+
+def print_rate_limit_stats():
+    """프로바이더별 실제 처리량 출력"""
+    if not _rate_limiters:
+        return
+    print("\n⏱️  Throughput (achieved)")
+    for limiter in list(_rate_limiters.values()):
+        st = limiter.stats()
+        print(
+            f"  {st['provider']}: {st['requests_per_sec']:.2f} req/s, "
+            f"{st['tokens_per_sec']:.1f} tokens/s "
+            f"(requests={st['requests']}, throttled={st['throttled']}, errors={st['errors']}, "
+            f"rate={st['current_rate']:.1f}/s, concurrency={st['current_concurrency']})"
+        )
@@ -0,0 +1,80 @@
+"""
+HEALO: bulk_load COPY 배열 컬럼 테스트
+
+text[] 컬럼(normalized_inquiries.missing_fields 등)에 list 값이 Postgres 배열 리터럴로,
+jsonb 컬럼에는 JSON으로 COPY 되는지 roundtrip 확인
+(임시 테이블 public._bulk_load_array_test 를 만들고 끝나면 삭제)
+
+실행:
+```bash
+DATABASE_URL=postgresql://... python scripts/test_bulk_load_arrays.py
+```
+"""
+
+import sys
+
+import psycopg2
+
+from evaluation_colab import DATABASE_URL, bulk_load
+
+TABLE = "public._bulk_load_array_test"
+
+ROWS = [
+    {
+        "id": 1,
+        "missing_fields": ["budget", "b,c", 'q"uote', "back\\slash", "", None, "NULL", "일정 {x}"],
+        "constraints": {"intake": {"treatment": ["botox"]}},
+        "tags": ["x", "y"],
+    },
+    {"id": 2, "missing_fields": [], "constraints": None, "tags": []},
+]
+
+
+def check(conn, label: str) -> bool:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT id, missing_fields, constraints, tags FROM {TABLE} ORDER BY id")
+        got = cur.fetchall()
+    expected = [(r["id"], r["missing_fields"], r["constraints"], r["tags"]) for r in ROWS]
+    ok = got == expected
+    print(f"{label}: {'✅ 일치' if ok else '❌ 불일치'}")
+    if not ok:
+        print(f"  expected: {expected}\n  got:      {got}")
+    return ok
+
+
+def main() -> int:
+    if not DATABASE_URL:
+        print("❌ 오류: DATABASE_URL 환경변수가 설정되지 않았습니다.")
+        return 1
+
+    conn = psycopg2.connect(DATABASE_URL)
+    conn.autocommit = True
+    ok = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+            cur.execute(
+                f"CREATE TABLE {TABLE} (id int PRIMARY KEY, missing_fields text[], constraints jsonb, tags jsonb)"
+            )
+
+        print("\n1️⃣ COPY (conflict 키 없음)")
+        bulk_load(ROWS, TABLE, database_url=DATABASE_URL)
+        ok &= check(conn, "text[] / jsonb roundtrip")
+
+        print("\n2️⃣ COPY → 임시 테이블 → INSERT ... ON CONFLICT")
+        with conn.cursor() as cur:
+            cur.execute(f"TRUNCATE {TABLE}")
+        bulk_load(ROWS, TABLE, ["id"], database_url=DATABASE_URL)
+        bulk_load(ROWS, TABLE, ["id"], database_url=DATABASE_URL)
+        ok &= check(conn, "upsert 재실행 후 roundtrip")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        conn.close()
+
+    print("\n✅ 모든 테스트 통과\n" if ok else "\n❌ 테스트 실패\n")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
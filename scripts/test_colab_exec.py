@@ -0,0 +1,46 @@
+"""
+HEALO: Colab exec 실행 테스트
+
+COLAB_GUIDE.md의 `exec(open('evaluation_colab.py').read())` 흐름을 흉내 내서
+커널 인자(-f kernel.json)가 있는 sys.argv에서도 CLI 파싱 없이 main()이 정의되는지 확인
+
+실행:
+```bash
+python scripts/test_colab_exec.py
+```
+"""
+
+import os
+import sys
+import types
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evaluation_colab.py")
+
+
+def main() -> int:
+    print("\n🧪 HEALO Colab exec 테스트\n")
+    print("=" * 60)
+
+    # Colab 커널과 같은 argv / 모듈 상태
+    sys.argv = [
+        "/usr/local/lib/python3/dist-packages/ipykernel_launcher.py",
+        "-f", "/root/.local/share/jupyter/runtime/kernel-test.json",
+    ]
+    sys.modules.setdefault("ipykernel", types.ModuleType("ipykernel"))
+
+    namespace = {"__name__": "__main__"}
+    try:
+        with open(SCRIPT, encoding="utf-8") as f:
+            exec(f.read(), namespace)
+    except SystemExit as e:
+        print(f"❌ exec 중 SystemExit({e.code}) — CLI 파싱이 실행됨")
+        return 1
+
+    ok = callable(namespace.get("main"))
+    print(f"{'✅' if ok else '❌'} exec 후 main() 정의됨: {ok}")
+    print(f"\n{'✅ 모든 테스트 통과' if ok else '❌ 테스트 실패'}\n")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+HEALO: extract_intake 기간/일정 패턴 테스트
+
+숫자로 시작하는 패턴이 더 긴 숫자의 일부에 매칭되지 않는지 확인
+("11개월" ≠ 1m, "2021년" ≠ 1y+, "13개월" ≠ 3m)
+
+실행:
+```bash
+python scripts/test_intake_extract.py
+```
+"""
+
+import sys
+
+from evaluation_colab import extract_intake
+
+# (문의, intake 키, 기대값)
+CASES = [
+    # 기간: 앞에 숫자가 붙으면 매칭하지 않음
+    ("11개월째 여드름이 있어요", "duration", None),
+    ("2021년부터 기미가 생겼어요", "duration", None),
+    ("13개월 전부터 탈모가 있어요", "duration", None),
+    ("16개월 동안 통증이 있었어요", "duration", None),
+    ("21 weeks of back pain", "duration", None),
+    ("2011年からシミがあります", "duration", None),
+    ("肌荒れが11ヶ月続いています", "duration", None),
+    # 기간: 정상 매칭
+    ("1개월째 여드름이 있어요", "duration", "1m"),
+    ("3개월 전부터 탈모가 있어요", "duration", "3m"),
+    ("6개월 동안 통증이 있었어요", "duration", "6m"),
+    ("1년 넘게 기미가 있어요", "duration", "1y+"),
+    ("I have had acne for 1 week", "duration", "1w"),
+    ("肌荒れが1ヶ月続いています", "duration", "1m"),
+    ("1年前からシミがあります", "duration", "1y+"),
+    # 일정: 앞에 숫자가 붙으면 매칭하지 않음
+    ("11-3 months", "timeline", None),
+    ("13-6개월", "timeline", None),
+    ("16개월 후에 방문할게요", "timeline", None),
+    # 일정: 정상 매칭
+    ("1-3개월 안에 방문하고 싶어요", "timeline", "1-3m"),
+    ("planning to visit in 3-6 months", "timeline", "3-6m"),
+    ("6개월 후에 방문할게요", "timeline", "6m+"),
+    ("2026년 11월 3일에 방문 예정", "timeline", "preferred_date:2026-11-03"),
+]
+
+
+def main() -> int:
+    print("\n🧪 HEALO extract_intake 기간/일정 패턴 테스트\n")
+    print("=" * 60)
+    failed = 0
+    for text, key, expected in CASES:
+        got = extract_intake(text)["constraints"]["intake"][key]
+        ok = got == expected
+        failed += 0 if ok else 1
+        print(f"{'✅' if ok else '❌'} {key}={got!r} (expected {expected!r}): {text}")
+
+    print(f"\n{'✅ 모든 테스트 통과' if not failed else f'❌ {failed}건 실패'}\n")
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
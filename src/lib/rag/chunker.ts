@@ -3,17 +3,36 @@ type Chunk = {
   content: string;
 };
 
+// 한자/가나는 글자당 정보량이 많아 같은 길이 제한이면 청크가 너무 커짐
+const MAX_LENGTH_BY_LANG: Record<string, number> = {
+  en: 800,
+  ko: 500,
+  ja: 400,
+};
+
+// 일본어는 띄어쓰기가 없으므로 문장을 이어 붙일 때 공백을 넣지 않음
+const SENTENCE_JOINER_BY_LANG: Record<string, string> = {
+  ja: "",
+};
+
 const splitSentences = (text: string) => {
   return text
     .replace(/\s+/g, " ")
     .trim()
-    .split(/(?<=[.!?])\s+/);
+    // 라틴 문장부호는 뒤에 공백이 있을 때만, 전각 문장부호(。！？)는 바로 뒤에서 분리
+    .split(/(?<=[.!?])\s+|(?<=[。！？])\s*/);
 };
 
-export const chunkText = (text: string, maxLength = 800): Chunk[] => {
+export const chunkText = (
+  text: string,
+  maxLength?: number,
+  lang = "en"
+): Chunk[] => {
   const normalized = text.replace(/\s+/g, " ").trim();
   if (!normalized) return [];
 
+  const limit = maxLength ?? MAX_LENGTH_BY_LANG[lang] ?? MAX_LENGTH_BY_LANG.en;
+  const joiner = SENTENCE_JOINER_BY_LANG[lang] ?? " ";
   const sentences = splitSentences(normalized);
   const chunks: Chunk[] = [];
   let current = "";
@@ -28,22 +47,22 @@ export const chunkText = (text: string, maxLength = 800): Chunk[] => {
 
   for (const sentence of sentences) {
     if (!sentence) continue;
-    if (sentence.length > maxLength) {
+    if (sentence.length > limit) {
       if (current) {
         pushChunk(current);
         current = "";
       }
-      for (let i = 0; i < sentence.length; i += maxLength) {
-        pushChunk(sentence.slice(i, i + maxLength));
+      for (let i = 0; i < sentence.length; i += limit) {
+        pushChunk(sentence.slice(i, i + limit));
       }
       continue;
     }
 
-    if ((current + " " + sentence).trim().length > maxLength) {
+    if ((current + joiner + sentence).trim().length > limit) {
       pushChunk(current);
       current = sentence;
     } else {
-      current = current ? `${current} ${sentence}` : sentence;
+      current = current ? `${current}${joiner}${sentence}` : sentence;
     }
   }
 
@@ -1,3 +1,4 @@
+import { createHash } from "crypto";
 import { supabaseAdmin } from "./supabaseAdmin";
 import { buildDocument } from "./buildDocument";
 import { chunkText } from "./chunker";
@@ -10,116 +11,206 @@ type SourceType =
   | "policy"
   | "faq";
 
+type IngestStats = {
+  scanned: number;
+  updated: number;
+  unchanged: number;
+  chunks: number;
+};
+
+type Cursor = { at: string | null; id: string } | null;
+
+type IngestOptions = {
+  sourceId?: string;
+  // true면 watermark를 무시하고 처음부터 다시 읽음 (내용이 같으면 여전히 건너뜀)
+  full?: boolean;
+  pageSize?: number;
+};
+
+const PAGE_SIZE = 500;
+const CHUNK_UPSERT_BATCH = 1000;
+const DELETE_CONCURRENCY = 10;
+
 const nowIso = () => new Date().toISOString();
 
-const fetchSourceRows = async (sourceType: SourceType, sourceId?: string) => {
-  switch (sourceType) {
-    case "treatment": {
-      let q = supabaseAdmin
-        .from("treatments")
-        .select(
-          "id, slug, name, description, full_description, tags, benefits, price_min, price_max, hospitals(name, location_en, location_kr)"
-        );
-      if (sourceId) q = q.eq("id", sourceId);
-      return q;
-    }
-    case "hospital": {
-      let q = supabaseAdmin
-        .from("hospitals")
-        .select(
-          "id, slug, name, description, location_en, location_kr, address_detail, tags, operating_hours, doctor_profile"
-        );
-      if (sourceId) q = q.eq("id", sourceId);
-      return q;
-    }
-    case "review": {
-      let q = supabaseAdmin
-        .from("reviews")
-        .select("id, treatment_id, user_name, country, rating, content, created_at");
-      if (sourceId) q = q.eq("id", sourceId);
-      return q;
-    }
-    case "normalized_inquiry": {
-      let q = supabaseAdmin
-        .from("normalized_inquiries")
-        .select(
-          "id, language, country, treatment_id, treatment_slug, objective, constraints, raw_message, extraction_confidence, missing_fields, contact"
-        );
-      if (sourceId) q = q.eq("id", sourceId);
-      return q;
-    }
-    default:
-      return { data: [], error: null };
-  }
+const contentHash = (content: string) =>
+  createHash("sha256").update(content, "utf8").digest("hex");
+
+// 소스별 테이블/컬럼 (changedAt: 증분 적재 기준 컬럼)
+const SOURCE_CONFIG: Partial<
+  Record<SourceType, { table: string; select: string; changedAt: string }>
+> = {
+  treatment: {
+    table: "treatments",
+    select:
+      "id, slug, name, description, full_description, tags, benefits, price_min, price_max, updated_at, hospitals(name, location_en, location_kr)",
+    changedAt: "updated_at",
+  },
+  hospital: {
+    table: "hospitals",
+    select:
+      "id, slug, name, description, location_en, location_kr, address_detail, tags, operating_hours, doctor_profile, updated_at",
+    changedAt: "updated_at",
+  },
+  review: {
+    // 리뷰는 수정되지 않으므로 created_at 기준
+    table: "reviews",
+    select: "id, treatment_id, user_name, country, rating, content, created_at",
+    changedAt: "created_at",
+  },
+  normalized_inquiry: {
+    table: "normalized_inquiries",
+    select:
+      "id, language, country, treatment_id, treatment_slug, objective, constraints, raw_message, extraction_confidence, missing_fields, contact, created_at",
+    changedAt: "created_at",
+  },
 };
 
-const upsertDocumentAndChunks = async (doc: {
-  source_type: SourceType;
-  source_id: string;
-  lang: string;
-  title: string | null;
-  content: string;
-}) => {
-  const { data: existing, error: existingError } = await supabaseAdmin
-    .from("rag_documents")
-    .select("id, content, version")
-    .eq("source_type", doc.source_type)
-    .eq("source_id", doc.source_id)
-    .eq("lang", doc.lang)
+const loadCursor = async (sourceType: SourceType): Promise<Cursor> => {
+  const { data, error } = await supabaseAdmin
+    .from("rag_ingest_state")
+    .select("cursor_at, cursor_id")
+    .eq("source_type", sourceType)
     .maybeSingle();
+  if (error) throw error;
+  if (!data?.cursor_id) return null;
+  return { at: data.cursor_at, id: data.cursor_id };
+};
 
-  if (existingError) throw existingError;
+const saveCursor = async (sourceType: SourceType, cursor: Cursor) => {
+  if (!cursor) return;
+  const { error } = await supabaseAdmin.from("rag_ingest_state").upsert(
+    {
+      source_type: sourceType,
+      cursor_at: cursor.at,
+      cursor_id: cursor.id,
+      updated_at: nowIso(),
+    },
+    { onConflict: "source_type" }
+  );
+  if (error) throw error;
+};
 
-  const needsUpdate = !existing || existing.content !== doc.content;
-  let documentId = existing?.id;
-  let version = existing?.version ?? 1;
-
-  if (!existing) {
-    const { data: inserted, error } = await supabaseAdmin
-      .from("rag_documents")
-      .insert({
-        source_type: doc.source_type,
-        source_id: doc.source_id,
-        lang: doc.lang,
-        title: doc.title,
-        content: doc.content,
-        version: 1,
-        created_at: nowIso(),
-        updated_at: nowIso(),
-      })
-      .select("id, version")
-      .single();
+/**
+ * 커서 이후 행을 (변경 시각, id) 순서로 한 페이지 조회
+ * - changedAt이 NULL인 행은 맨 앞에 오므로 첫 적재에서만 읽힘
+ */
+const fetchSourcePage = async (
+  sourceType: SourceType,
+  cursor: Cursor,
+  pageSize: number
+) => {
+  const config = SOURCE_CONFIG[sourceType];
+  if (!config) return { data: [], error: null };
 
-    if (error) throw error;
-    documentId = inserted.id;
-    version = inserted.version;
-  } else if (needsUpdate) {
-    const { data: updated, error } = await supabaseAdmin
-      .from("rag_documents")
-      .update({
-        title: doc.title,
-        content: doc.content,
-        version: version + 1,
-        updated_at: nowIso(),
-      })
-      .eq("id", existing.id)
-      .select("id, version")
-      .single();
+  const column = config.changedAt;
+  let q = supabaseAdmin
+    .from(config.table)
+    .select(config.select)
+    .order(column, { ascending: true, nullsFirst: true })
+    .order("id", { ascending: true })
+    .limit(pageSize);
 
-    if (error) throw error;
-    documentId = updated.id;
-    version = updated.version;
+  if (cursor) {
+    q =
+      cursor.at === null
+        ? q.or(`${column}.not.is.null,and(${column}.is.null,id.gt.${cursor.id})`)
+        : q.or(
+            `${column}.gt."${cursor.at}",and(${column}.eq."${cursor.at}",id.gt.${cursor.id})`
+          );
   }
+  return q;
+};
+
+const fetchSourceRow = async (sourceType: SourceType, sourceId: string) => {
+  const config = SOURCE_CONFIG[sourceType];
+  if (!config) return { data: [], error: null };
+  return supabaseAdmin.from(config.table).select(config.select).eq("id", sourceId);
+};
+
+const runInBatches = async <T>(
+  items: T[],
+  size: number,
+  fn: (item: T) => Promise<void>
+) => {
+  for (let i = 0; i < items.length; i += size) {
+    await Promise.all(items.slice(i, i + size).map(fn));
+  }
+};
+
+/**
+ * 소스 행 한 페이지를 문서/청크로 변환해서 배치 upsert
+ * - content_hash가 같은 문서는 건너뜀 (version 유지)
+ * - 바뀐 문서만 version + 1, 청크는 (document_id, chunk_index)로 제자리 갱신 후 남는 꼬리 삭제
+ */
+const ingestRows = async (
+  sourceType: SourceType,
+  rows: any[],
+  stats: IngestStats
+) => {
+  stats.scanned += rows.length;
+  const docs = rows
+    .map((row) => buildDocument(sourceType, row))
+    .filter((doc) => doc.content)
+    .map((doc) => ({ ...doc, content_hash: contentHash(doc.content) }));
+  if (docs.length === 0) return;
+
+  const docKey = (sourceId: string, lang: string) => `${sourceId}:${lang}`;
+  const sourceIds = Array.from(new Set(docs.map((doc) => doc.source_id)));
+  const { data: existing, error: existingError } = await supabaseAdmin
+    .from("rag_documents")
+    .select("source_id, lang, content_hash, version")
+    .eq("source_type", sourceType)
+    .in("source_id", sourceIds);
+  if (existingError) throw existingError;
 
-  if (!documentId) return { updated: false, documentId: null };
+  const existingByKey = new Map(
+    (existing || []).map((doc: any) => [docKey(doc.source_id, doc.lang), doc])
+  );
+  const changed = docs.filter(
+    (doc) =>
+      existingByKey.get(docKey(doc.source_id, doc.lang))?.content_hash !==
+      doc.content_hash
+  );
+  stats.unchanged += docs.length - changed.length;
+  if (changed.length === 0) return;
 
-  if (needsUpdate) {
-    await supabaseAdmin.from("rag_chunks").delete().eq("document_id", documentId);
+  const updatedAt = nowIso();
+  const { data: upserted, error: upsertError } = await supabaseAdmin
+    .from("rag_documents")
+    .upsert(
+      changed.map((doc) => {
+        const previous: any = existingByKey.get(docKey(doc.source_id, doc.lang));
+        return {
+          source_type: doc.source_type,
+          source_id: doc.source_id,
+          lang: doc.lang,
+          title: doc.title,
+          content: doc.content,
+          content_hash: doc.content_hash,
+          version: previous ? (previous.version ?? 1) + 1 : 1,
+          updated_at: updatedAt,
+        };
+      }),
+      { onConflict: "source_type,source_id,lang" }
+    )
+    .select("id, source_id, lang, version");
+  if (upsertError) throw upsertError;
 
-    const chunks = chunkText(doc.content);
-    if (chunks.length > 0) {
-      const payload = chunks.map((chunk) => ({
-        document_id: documentId,
+  const changedByKey = new Map(
+    changed.map((doc) => [docKey(doc.source_id, doc.lang), doc])
+  );
+  const chunkRows: any[] = [];
+  const chunkCounts: Array<{ documentId: string; count: number }> = [];
+
+  for (const saved of upserted || []) {
+    const doc = changedByKey.get(docKey(saved.source_id, saved.lang));
+    if (!doc) continue;
+    const chunks = chunkText(doc.content, undefined, doc.lang);
+    chunkCounts.push({ documentId: saved.id, count: chunks.length });
+    for (const chunk of chunks) {
+      chunkRows.push({
+        document_id: saved.id,
         chunk_index: chunk.index,
         content: chunk.content,
         metadata: {
@@ -127,15 +218,71 @@ const upsertDocumentAndChunks = async (doc: {
           source_id: doc.source_id,
           lang: doc.lang,
           title: doc.title,
-          version,
+          version: saved.version,
         },
-      }));
-      const { error } = await supabaseAdmin.from("rag_chunks").insert(payload);
-      if (error) throw error;
+      });
     }
   }
 
-  return { updated: needsUpdate, documentId };
+  for (let i = 0; i < chunkRows.length; i += CHUNK_UPSERT_BATCH) {
+    const { error } = await supabaseAdmin
+      .from("rag_chunks")
+      .upsert(chunkRows.slice(i, i + CHUNK_UPSERT_BATCH), {
+        onConflict: "document_id,chunk_index",
+      });
+    if (error) throw error;
+  }
+
+  // 문서가 짧아져서 남은 이전 청크 삭제
+  await runInBatches(chunkCounts, DELETE_CONCURRENCY, async ({ documentId, count }) => {
+    const { error } = await supabaseAdmin
+      .from("rag_chunks")
+      .delete()
+      .eq("document_id", documentId)
+      .gte("chunk_index", count);
+    if (error) throw error;
+  });
+
+  stats.updated += upserted?.length ?? 0;
+  stats.chunks += chunkRows.length;
+};
+
+const ingestSource = async (
+  sourceType: SourceType,
+  options: IngestOptions
+): Promise<IngestStats> => {
+  const stats: IngestStats = { scanned: 0, updated: 0, unchanged: 0, chunks: 0 };
+  const config = SOURCE_CONFIG[sourceType];
+  if (!config) return stats;
+
+  // 단건 재적재: watermark와 무관
+  if (options.sourceId) {
+    const { data, error } = await fetchSourceRow(sourceType, options.sourceId);
+    if (error) throw error;
+    await ingestRows(sourceType, data || [], stats);
+    return stats;
+  }
+
+  const pageSize = options.pageSize ?? PAGE_SIZE;
+  let cursor = options.full ? null : await loadCursor(sourceType);
+
+  while (true) {
+    const { data, error } = await fetchSourcePage(sourceType, cursor, pageSize);
+    if (error) throw error;
+    const rows = data || [];
+    if (rows.length === 0) break;
+
+    await ingestRows(sourceType, rows, stats);
+
+    // 페이지가 다 기록된 뒤에만 커서 전진 (중간 실패 시 이 페이지부터 다시)
+    const last: any = rows[rows.length - 1];
+    cursor = { at: last[config.changedAt] ?? null, id: String(last.id) };
+    await saveCursor(sourceType, cursor);
+
+    if (rows.length < pageSize) break;
+  }
+
+  return stats;
 };
 
 export const ingestSources = async (
@@ -145,22 +292,13 @@ export const ingestSources = async (
     "review",
     "normalized_inquiry",
   ],
-  sourceId?: string
+  sourceId?: string,
+  options: Omit<IngestOptions, "sourceId"> = {}
 ) => {
-  const results: Record<string, number> = {};
+  const results: Record<string, IngestStats> = {};
 
   for (const sourceType of sourceTypes) {
-    const { data, error } = await fetchSourceRows(sourceType, sourceId);
-    if (error) throw error;
-
-    let updatedCount = 0;
-    for (const row of data || []) {
-      const doc = buildDocument(sourceType, row);
-      if (!doc.content) continue;
-      const result = await upsertDocumentAndChunks(doc);
-      if (result.updated) updatedCount += 1;
-    }
-    results[sourceType] = updatedCount;
+    results[sourceType] = await ingestSource(sourceType, { ...options, sourceId });
   }
 
   return results;